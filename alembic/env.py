@@ -19,6 +19,8 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from app.models.device import Device
+from app.models.rollup import StatsRollup
+from app.models.sketch import StatsSketchBin
 from app.models.stats import Stats
 from app.models.user import User
 from app.models.database import Base
@@ -0,0 +1,47 @@
+"""stats time series indexes
+
+Revision ID: 3f1c2a7d9e41
+Revises: b96352b6b0c3
+Create Date: 2026-10-18 10:40:12.511274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7d9e41'
+down_revision: Union[str, None] = 'b96352b6b0c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # built concurrently so that an existing stats table keeps accepting writes
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_stats_device_id_timestamp',
+            'stats',
+            ['device_id', sa.text('timestamp DESC')],
+            unique=False,
+            postgresql_include=['x', 'y', 'z'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_stats_timestamp_brin',
+            'stats',
+            ['timestamp'],
+            unique=False,
+            postgresql_using='brin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_stats_timestamp_brin', table_name='stats', postgresql_concurrently=True)
+        op.drop_index('ix_stats_device_id_timestamp', table_name='stats', postgresql_concurrently=True)
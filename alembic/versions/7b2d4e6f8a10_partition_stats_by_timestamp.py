@@ -0,0 +1,110 @@
+"""partition stats by timestamp
+
+Revision ID: 7b2d4e6f8a10
+Revises: 3f1c2a7d9e41
+Create Date: 2026-10-18 11:02:47.903518
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+from app.services.partition_service import PartitionService
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2d4e6f8a10'
+down_revision: Union[str, None] = '3f1c2a7d9e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_stats_indexes() -> None:
+    op.create_index(op.f('ix_stats_id'), 'stats', ['id'], unique=False)
+    op.create_index(
+        'ix_stats_device_id_timestamp',
+        'stats',
+        ['device_id', sa.text('timestamp DESC')],
+        unique=False,
+        postgresql_include=['x', 'y', 'z'],
+    )
+    op.create_index('ix_stats_timestamp_brin', 'stats', ['timestamp'], unique=False, postgresql_using='brin')
+
+
+def _drop_stats_indexes(table_name: str) -> None:
+    op.drop_index('ix_stats_timestamp_brin', table_name=table_name)
+    op.drop_index('ix_stats_device_id_timestamp', table_name=table_name)
+    op.drop_index(op.f('ix_stats_id'), table_name=table_name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+
+    # the old table and its indexes move out of the way, the id sequence is kept for the new table
+    op.execute("ALTER SEQUENCE stats_id_seq OWNED BY NONE")
+    _drop_stats_indexes('stats')
+    op.execute("ALTER TABLE stats DROP CONSTRAINT stats_pkey")
+    op.rename_table('stats', 'stats_legacy')
+
+    op.execute(
+        "CREATE TABLE stats ("
+        "id INTEGER NOT NULL DEFAULT nextval('stats_id_seq'), "
+        "device_id INTEGER NOT NULL, "
+        "timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL, "
+        "x DOUBLE PRECISION NOT NULL, "
+        "y DOUBLE PRECISION NOT NULL, "
+        "z DOUBLE PRECISION NOT NULL"
+        ") PARTITION BY RANGE (timestamp)"
+    )
+    PartitionService.create_default_partition(connection)
+
+    now = datetime.utcnow()
+    first = connection.execute(sa.text("SELECT min(timestamp) FROM stats_legacy")).scalar() or now
+    end = PartitionService.interval_start(now)
+    for _ in range(settings.STATS_PARTITION_PREMAKE + 1):
+        end = PartitionService.next_interval_start(end)
+    PartitionService.ensure_partitions(connection, first, end)
+
+    op.execute(
+        "INSERT INTO stats (id, device_id, timestamp, x, y, z) "
+        "SELECT id, device_id, timestamp, x, y, z FROM stats_legacy"
+    )
+    op.drop_table('stats_legacy')
+
+    # a primary key on a partitioned table has to include the partition key
+    op.create_primary_key('stats_pkey', 'stats', ['id', 'timestamp'])
+    op.create_foreign_key('stats_device_id_fkey', 'stats', 'devices', ['device_id'], ['id'])
+    _create_stats_indexes()
+    op.execute("ALTER SEQUENCE stats_id_seq OWNED BY stats.id")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER SEQUENCE stats_id_seq OWNED BY NONE")
+    op.rename_table('stats', 'stats_partitioned')
+    _drop_stats_indexes('stats_partitioned')
+    op.execute("ALTER TABLE stats_partitioned DROP CONSTRAINT stats_pkey")
+
+    op.create_table('stats',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('stats_id_seq')"), nullable=False),
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('x', sa.Float(), nullable=False),
+    sa.Column('y', sa.Float(), nullable=False),
+    sa.Column('z', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        "INSERT INTO stats (id, device_id, timestamp, x, y, z) "
+        "SELECT id, device_id, timestamp, x, y, z FROM stats_partitioned"
+    )
+    op.drop_table('stats_partitioned')
+
+    op.create_foreign_key('stats_device_id_fkey', 'stats', 'devices', ['device_id'], ['id'])
+    _create_stats_indexes()
+    op.execute("ALTER SEQUENCE stats_id_seq OWNED BY stats.id")
+
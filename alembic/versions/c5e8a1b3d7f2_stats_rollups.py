@@ -0,0 +1,62 @@
+"""stats rollups
+
+Revision ID: c5e8a1b3d7f2
+Revises: 7b2d4e6f8a10
+Create Date: 2026-10-18 11:41:05.227190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8a1b3d7f2'
+down_revision: Union[str, None] = '7b2d4e6f8a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AGGREGATE_COLUMNS = "count, x_sum, x_min, x_max, y_sum, y_min, y_max, z_sum, z_min, z_max"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stats_rollups',
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('x_sum', sa.Float(), nullable=False),
+    sa.Column('x_min', sa.Float(), nullable=False),
+    sa.Column('x_max', sa.Float(), nullable=False),
+    sa.Column('y_sum', sa.Float(), nullable=False),
+    sa.Column('y_min', sa.Float(), nullable=False),
+    sa.Column('y_max', sa.Float(), nullable=False),
+    sa.Column('z_sum', sa.Float(), nullable=False),
+    sa.Column('z_min', sa.Float(), nullable=False),
+    sa.Column('z_max', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('device_id', 'granularity', 'bucket_start')
+    )
+
+    # backfill from the raw samples once, coarser levels are derived from the finer ones
+    op.execute(
+        f"INSERT INTO stats_rollups (device_id, granularity, bucket_start, {AGGREGATE_COLUMNS}) "
+        "SELECT device_id, 'minute', date_trunc('minute', timestamp), count(*), "
+        "sum(x), min(x), max(x), sum(y), min(y), max(y), sum(z), min(z), max(z) "
+        "FROM stats GROUP BY device_id, date_trunc('minute', timestamp)"
+    )
+    for granularity, source in (('hour', 'minute'), ('day', 'hour')):
+        op.execute(
+            f"INSERT INTO stats_rollups (device_id, granularity, bucket_start, {AGGREGATE_COLUMNS}) "
+            f"SELECT device_id, '{granularity}', date_trunc('{granularity}', bucket_start), sum(count), "
+            "sum(x_sum), min(x_min), max(x_max), sum(y_sum), min(y_min), max(y_max), sum(z_sum), min(z_min), max(z_max) "
+            f"FROM stats_rollups WHERE granularity = '{source}' "
+            f"GROUP BY device_id, date_trunc('{granularity}', bucket_start)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stats_rollups')
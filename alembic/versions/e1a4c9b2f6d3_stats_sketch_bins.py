@@ -0,0 +1,61 @@
+"""stats sketch bins
+
+Revision ID: e1a4c9b2f6d3
+Revises: c5e8a1b3d7f2
+Create Date: 2026-10-18 12:20:33.684012
+
+"""
+import math
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+from app.services.sketch import KEY_OFFSET, MIN_INDEXABLE_VALUE
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a4c9b2f6d3'
+down_revision: Union[str, None] = 'c5e8a1b3d7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stats_sketch_bins',
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('axis', sa.String(length=1), nullable=False),
+    sa.Column('bin', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('device_id', 'granularity', 'bucket_start', 'axis', 'bin')
+    )
+
+    # same key function as DDSketch.key, evaluated in SQL for the existing samples
+    accuracy = settings.STATS_SKETCH_RELATIVE_ACCURACY
+    log_gamma = math.log((1 + accuracy) / (1 - accuracy))
+    bin_expression = (
+        f"CASE WHEN abs(value) < {MIN_INDEXABLE_VALUE!r} THEN 0 "
+        f"ELSE sign(value)::integer * (ceil(ln(abs(value)) / {log_gamma!r})::integer + {KEY_OFFSET}) END"
+    )
+    op.execute(
+        "INSERT INTO stats_sketch_bins (device_id, granularity, bucket_start, axis, bin, count) "
+        f"SELECT device_id, 'hour', date_trunc('hour', timestamp), axis, {bin_expression}, count(*) "
+        "FROM stats CROSS JOIN LATERAL (VALUES ('x', x), ('y', y), ('z', z)) AS axes (axis, value) "
+        f"GROUP BY device_id, date_trunc('hour', timestamp), axis, {bin_expression}"
+    )
+    op.execute(
+        "INSERT INTO stats_sketch_bins (device_id, granularity, bucket_start, axis, bin, count) "
+        "SELECT device_id, 'day', date_trunc('day', bucket_start), axis, bin, sum(count) "
+        "FROM stats_sketch_bins WHERE granularity = 'hour' "
+        "GROUP BY device_id, date_trunc('day', bucket_start), axis, bin"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stats_sketch_bins')
@@ -0,0 +1,43 @@
+"""stats keyset index
+
+Revision ID: f2b7d1c4a9e6
+Revises: e1a4c9b2f6d3
+Create Date: 2026-10-18 13:05:21.447193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b7d1c4a9e6'
+down_revision: Union[str, None] = 'e1a4c9b2f6d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # id breaks timestamp ties (a batch shares one timestamp), so cursor pages can seek straight to their first row
+    op.create_index(
+        'ix_stats_device_id_timestamp_id',
+        'stats',
+        ['device_id', sa.text('timestamp DESC'), sa.text('id DESC')],
+        unique=False,
+        postgresql_include=['x', 'y', 'z'],
+    )
+    op.drop_index('ix_stats_device_id_timestamp', table_name='stats')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        'ix_stats_device_id_timestamp',
+        'stats',
+        ['device_id', sa.text('timestamp DESC')],
+        unique=False,
+        postgresql_include=['x', 'y', 'z'],
+    )
+    op.drop_index('ix_stats_device_id_timestamp_id', table_name='stats')
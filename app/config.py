@@ -12,9 +12,60 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "device_stats")
     POSTGRES_PORT: str = os.getenv("POSTGRES_PORT", "5432")
 
+    # async services run on the event loop through run_sync, CPU-bound steps inside them go through offload()
+    DATABASE_ASYNC: bool = os.getenv("DATABASE_ASYNC", "false").lower() == "true"
+
+    STATS_BATCH_MAX_SIZE: int = int(os.getenv("STATS_BATCH_MAX_SIZE", "10000"))
+
+    STATS_EXPORT_CHUNK_SIZE: int = int(os.getenv("STATS_EXPORT_CHUNK_SIZE", "5000"))
+
+    STATS_SERIES_MAX_POINTS: int = int(os.getenv("STATS_SERIES_MAX_POINTS", "10000"))
+
+    STATS_INGEST_BUFFER_ENABLED: bool = os.getenv("STATS_INGEST_BUFFER_ENABLED", "false").lower() == "true"
+    STATS_INGEST_ACK: str = os.getenv("STATS_INGEST_ACK", "buffered")
+    STATS_INGEST_BUFFER_SIZE: int = int(os.getenv("STATS_INGEST_BUFFER_SIZE", "100000"))
+    STATS_INGEST_FLUSH_SIZE: int = int(os.getenv("STATS_INGEST_FLUSH_SIZE", "1000"))
+    STATS_INGEST_FLUSH_INTERVAL: float = float(os.getenv("STATS_INGEST_FLUSH_INTERVAL", "0.1"))
+    STATS_INGEST_ENQUEUE_TIMEOUT: float = float(os.getenv("STATS_INGEST_ENQUEUE_TIMEOUT", "1"))
+    STATS_INGEST_FLUSH_ATTEMPTS: int = int(os.getenv("STATS_INGEST_FLUSH_ATTEMPTS", "3"))
+
+    DEVICE_CACHE_SIZE: int = int(os.getenv("DEVICE_CACHE_SIZE", "10000"))
+    DEVICE_CACHE_TTL: float = float(os.getenv("DEVICE_CACHE_TTL", "300"))
+
+    STATS_ANALYSIS_CACHE_SIZE: int = int(os.getenv("STATS_ANALYSIS_CACHE_SIZE", "1000"))
+    STATS_ANALYSIS_CACHE_TTL: float = float(os.getenv("STATS_ANALYSIS_CACHE_TTL", "5"))
+    STATS_ANALYSIS_CACHE_CLOSED_AFTER: float = float(os.getenv("STATS_ANALYSIS_CACHE_CLOSED_AFTER", "60"))
+    STATS_ANALYSIS_CACHE_CLOSED_TTL: float = float(os.getenv("STATS_ANALYSIS_CACHE_CLOSED_TTL", "3600"))
+
+    STATS_ANALYSIS_EXECUTOR: str = os.getenv("STATS_ANALYSIS_EXECUTOR", "inline")
+    STATS_ANALYSIS_PROCESSES: int = int(os.getenv("STATS_ANALYSIS_PROCESSES", "0"))
+    STATS_ANALYSIS_OFFLOAD_MIN_ROWS: int = int(os.getenv("STATS_ANALYSIS_OFFLOAD_MIN_ROWS", "100000"))
+
+    QUERY_PROFILER_ENABLED: bool = os.getenv("QUERY_PROFILER_ENABLED", "false").lower() == "true"
+    QUERY_PROFILER_SLOW_REQUEST: float = float(os.getenv("QUERY_PROFILER_SLOW_REQUEST", "1"))
+    QUERY_PROFILER_REPEAT_THRESHOLD: int = int(os.getenv("QUERY_PROFILER_REPEAT_THRESHOLD", "5"))
+
+    STATS_ROLLUPS_ENABLED: bool = os.getenv("STATS_ROLLUPS_ENABLED", "true").lower() == "true"
+    STATS_SKETCHES_ENABLED: bool = os.getenv("STATS_SKETCHES_ENABLED", "true").lower() == "true"
+    STATS_SKETCH_RELATIVE_ACCURACY: float = float(os.getenv("STATS_SKETCH_RELATIVE_ACCURACY", "0.01"))
+
+    STATS_ARCHIVE_PATH: str = os.getenv("STATS_ARCHIVE_PATH", "")
+    STATS_ARCHIVE_AFTER_DAYS: int = int(os.getenv("STATS_ARCHIVE_AFTER_DAYS", "90"))
+    STATS_ARCHIVE_ROW_GROUP_SIZE: int = int(os.getenv("STATS_ARCHIVE_ROW_GROUP_SIZE", "65536"))
+
+    STATS_PARTITION_INTERVAL: str = os.getenv("STATS_PARTITION_INTERVAL", "month")
+    STATS_PARTITION_PREMAKE: int = int(os.getenv("STATS_PARTITION_PREMAKE", "3"))
+    STATS_PARTITION_RETENTION: int = int(os.getenv("STATS_PARTITION_RETENTION", "0"))
+    STATS_PARTITION_EXPIRE_ACTION: str = os.getenv("STATS_PARTITION_EXPIRE_ACTION", "detach")
+    STATS_PARTITION_MAINTENANCE_INTERVAL: float = float(os.getenv("STATS_PARTITION_MAINTENANCE_INTERVAL", "3600"))
+
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    @property
+    def SQLALCHEMY_ASYNC_DATABASE_URI(self) -> str:
+        return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+
 
 settings = Settings()
\ No newline at end of file
@@ -1,15 +1,48 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.models.database import engine, Base
-from app.routers import devices, stats, users
+from app.metrics import MetricsMiddleware, instrument_engine
+from app.models.database import async_engine, engine, Base
+from app.profiling import QueryProfilerMiddleware, instrument_engine as instrument_profiler
+from app.routers import devices, metrics, stats, users
+from app.services.analysis_pool import analysis_pool
+from app.services.ingest_buffer import ingest_buffer
+from app.services.partition_service import partition_maintenance_loop
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.STATS_INGEST_BUFFER_ENABLED:
+        ingest_buffer.start()
+    if settings.STATS_ANALYSIS_EXECUTOR == "process":
+        analysis_pool.start()
+
+    tasks = []
+    if settings.STATS_PARTITION_MAINTENANCE_INTERVAL > 0:
+        tasks.append(asyncio.create_task(partition_maintenance_loop(settings.STATS_PARTITION_MAINTENANCE_INTERVAL)))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    if settings.STATS_INGEST_BUFFER_ENABLED:
+        await ingest_buffer.close()
+    if settings.STATS_ANALYSIS_EXECUTOR == "process":
+        analysis_pool.close()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version="1.0.0",
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
-    docs_url="/docs"
+    docs_url="/docs",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -18,11 +51,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Query-Count", "X-DB-Time"],
 )
+app.add_middleware(MetricsMiddleware)
+
+instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
+
+if settings.QUERY_PROFILER_ENABLED:
+    app.add_middleware(
+        QueryProfilerMiddleware,
+        slow_request=settings.QUERY_PROFILER_SLOW_REQUEST,
+        repeat_threshold=settings.QUERY_PROFILER_REPEAT_THRESHOLD
+    )
+    instrument_profiler(engine)
+    if async_engine is not None:
+        instrument_profiler(async_engine.sync_engine)
 
 app.include_router(devices.router, prefix=settings.API_V1_STR)
 app.include_router(stats.router, prefix=settings.API_V1_STR)
 app.include_router(users.router, prefix=settings.API_V1_STR)
+app.include_router(metrics.router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,197 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+QUERY_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in values)
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # per label set: a count per bucket (non-cumulative, the last one is +Inf), the sum and the count
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _labels(self.labels, key, f'le="{_number(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class RateMeter:
+    def __init__(self, window: float):
+        self.window = window
+        self._events: Deque[Tuple[float, float]] = deque()
+        self._lock = threading.Lock()
+
+    def mark(self, amount: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._events.append((now, amount))
+            self._expire(now)
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            return sum(amount for _, amount in self._events) / self.window
+
+    def _expire(self, now: float) -> None:
+        while self._events and self._events[0][0] < now - self.window:
+            self._events.popleft()
+
+
+def render_gauges(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return lines
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time spent serving HTTP requests, by route template",
+    ("method", "route", "status"),
+    REQUEST_BUCKETS
+)
+query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing SQL statements, by statement type",
+    ("operation",),
+    QUERY_BUCKETS
+)
+ingested_rows = Counter("stats_ingested_rows_total", "Stats samples written to the database")
+ingest_rate = RateMeter(window=60)
+
+
+def record_ingested(rows: int) -> None:
+    ingested_rows.inc(rows)
+    ingest_rate.mark(rows)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    query_duration.observe(elapsed, operation if operation in QUERY_OPERATIONS else "OTHER")
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute, drop its start time
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_duration.observe(
+                time.perf_counter() - started, scope["method"], route_template(scope), str(status["code"])
+            )
+
+
+def route_template(scope) -> str:
+    # the route template keeps the label set bounded, unmatched paths share one label
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+
+    # routes of an included router may not carry the include prefix, take it from the matched path
+    parts = scope["path"].split("/")
+    return "/".join(parts[:len(parts) - route.path.count("/")]) + route.path
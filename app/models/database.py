@@ -1,18 +1,87 @@
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, TypeVar, Union
+
+from sqlalchemy import Executable, Row, create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from starlette.concurrency import run_in_threadpool
 
 from app.config import settings
 
+T = TypeVar("T")
+
 engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if settings.DATABASE_ASYNC:
+    async_engine = create_async_engine(settings.SQLALCHEMY_ASYNC_DATABASE_URI)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[Union[Session, AsyncSession]]:
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+
+async def get_db() -> AsyncIterator[Union[Session, AsyncSession]]:
+    async with session_scope() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def run_db(db: Union[Session, AsyncSession], fn: Callable[..., T], *args, **kwargs) -> T:
+    # services are written against a sync Session; an AsyncSession runs them on its greenlet bridge so the
+    # event loop is free while the driver waits, the sync stack keeps using the threadpool
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def offload(fn: Callable[..., T], *args, **kwargs) -> T:
+    # run_sync keeps the service on the event loop thread, CPU-bound work inside it is handed to the threadpool and
+    # awaited through the greenlet bridge; on the sync stack the service already runs in a worker thread
+    if in_greenlet():
+        return await_only(run_in_threadpool(fn, *args, **kwargs))
+    return fn(*args, **kwargs)
+
+
+async def release_db(db: Union[Session, AsyncSession]) -> None:
+    # gives the pooled connection back while the request waits on something else, the session reconnects if used again
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+
+async def stream_rows(statement: Executable, chunk_size: int) -> AsyncIterator[List[Row]]:
+    # rows come from a server-side cursor chunk by chunk, so memory does not grow with the size of the result
+    async with session_scope() as db:
+        statement = statement.execution_options(yield_per=chunk_size)
+        if isinstance(db, AsyncSession):
+            result = await db.stream(statement)
+            async for partition in result.partitions():
+                yield partition
+            return
+
+        result = await run_in_threadpool(db.execute, statement)
+        try:
+            while True:
+                partition = await run_in_threadpool(result.fetchmany, chunk_size)
+                if not partition:
+                    break
+                yield partition
+        finally:
+            await run_in_threadpool(result.close)
@@ -13,4 +13,5 @@ class Device(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
     user = relationship("User", back_populates="devices")
-    stats = relationship("Stats", back_populates="device", cascade="all, delete-orphan")
\ No newline at end of file
+    # stats are removed in bulk by DeviceService.delete_stats, never loaded one row at a time for a delete
+    stats = relationship("Stats", back_populates="device", cascade="all, delete-orphan", passive_deletes=True)
\ No newline at end of file
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, String
+
+from app.models.database import Base
+
+
+class StatsRollup(Base):
+    __tablename__ = "stats_rollups"
+
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True)
+    granularity = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False)
+    x_sum = Column(Float, nullable=False)
+    x_min = Column(Float, nullable=False)
+    x_max = Column(Float, nullable=False)
+    y_sum = Column(Float, nullable=False)
+    y_min = Column(Float, nullable=False)
+    y_max = Column(Float, nullable=False)
+    z_sum = Column(Float, nullable=False)
+    z_min = Column(Float, nullable=False)
+    z_max = Column(Float, nullable=False)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, String
+
+from app.models.database import Base
+
+
+class StatsSketchBin(Base):
+    __tablename__ = "stats_sketch_bins"
+
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True)
+    granularity = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    axis = Column(String(1), primary_key=True)
+    bin = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(Integer, nullable=False)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from app.models.database import Base
@@ -15,4 +15,12 @@ class Stats(Base):
     y = Column(Float, nullable=False)
     z = Column(Float, nullable=False)
 
+    # on PostgreSQL the table is range-partitioned on timestamp, see PartitionService
+    __table_args__ = (
+        Index(
+            "ix_stats_device_id_timestamp_id", device_id, timestamp.desc(), id.desc(), postgresql_include=["x", "y", "z"]
+        ),
+        Index("ix_stats_timestamp_brin", timestamp, postgresql_using="brin"),
+    )
+
     device = relationship("Device", back_populates="stats")
\ No newline at end of file
@@ -0,0 +1,118 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+_PARAMETER = re.compile(r"%\(\w+\)s|\$\d+|\?|\b\d+(\.\d+)?\b|'[^']*'")
+_PARAMETER_LIST = re.compile(r"\?(\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    # literals and bind parameters become ?, so the same query with other values or IN list sizes has one shape
+    shape = _PARAMETER.sub("?", _WHITESPACE.sub(" ", statement.strip()))
+    return _PARAMETER_LIST.sub("?", shape)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.statements: List[Tuple[str, float]] = []
+
+    @property
+    def query_count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def db_time(self) -> float:
+        return sum(duration for _, duration in self.statements)
+
+    def breakdown(self) -> List[Tuple[str, int, float]]:
+        shapes: Dict[str, List] = {}
+        for statement, duration in self.statements:
+            entry = shapes.setdefault(statement_shape(statement), [0, 0.0])
+            entry[0] += 1
+            entry[1] += duration
+        return sorted(((shape, count, total) for shape, (count, total) in shapes.items()), key=lambda item: -item[2])
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        counts = Counter(statement_shape(statement) for statement, _ in self.statements)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None and conn.info.get("profile_started"):
+        profile.statements.append((statement, time.perf_counter() - conn.info["profile_started"].pop()))
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("profile_started"):
+        context.connection.info["profile_started"].pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class QueryProfilerMiddleware:
+    def __init__(self, app, slow_request: float, repeat_threshold: int):
+        self.app = app
+        self.slow_request = slow_request
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            # streamed bodies keep querying after this point, their headers only count the queries before it
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(profile.query_count).encode()))
+                headers.append((b"x-db-time", f"{profile.db_time * 1000:.3f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            self.report(scope, profile, time.perf_counter() - started)
+
+    def report(self, scope, profile: RequestProfile, elapsed: float) -> None:
+        request = f"{scope['method']} {route_template(scope)}"
+        for shape, count in profile.repeated(self.repeat_threshold):
+            logger.warning("possible N+1 in %s: %d queries of the shape %s", request, count, shape)
+
+        if self.slow_request and elapsed >= self.slow_request:
+            lines = [
+                f"  {count:4d} x {total * 1000:9.3f} ms  {shape}" for shape, count, total in profile.breakdown()
+            ]
+            logger.warning(
+                "slow request %s: %.3f s, %d queries, %.3f ms in the database\n%s",
+                request, elapsed, profile.query_count, profile.db_time * 1000, "\n".join(lines)
+            )
@@ -0,0 +1,17 @@
+from typing import Any, Dict, Iterable, List, Sequence
+
+import orjson
+from starlette.responses import Response
+
+STATS_FIELDS = ("x", "y", "z", "id", "device_id", "timestamp")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def rows_to_dicts(fields: Sequence[str], rows: Iterable[Sequence]) -> List[Dict[str, Any]]:
+    return [dict(zip(fields, row)) for row in rows]
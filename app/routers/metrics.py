@@ -0,0 +1,51 @@
+from typing import Dict, List
+
+from fastapi import APIRouter, Response
+
+from app.metrics import CONTENT_TYPE, ingest_rate, ingested_rows, query_duration, render_gauges, request_duration
+from app.models.database import async_engine, engine
+from app.services.analysis_pool import analysis_pool
+from app.services.device_service import DeviceService
+from app.services.ingest_buffer import ingest_buffer
+from app.services.stats_service import StatsService
+
+router = APIRouter(tags=["metrics"])
+
+
+def pool_gauges() -> List[str]:
+    engines = {"sync": engine}
+    if async_engine is not None:
+        engines["async"] = async_engine.sync_engine
+
+    lines = []
+    for metric, documentation, attribute in (
+            ("db_pool_size", "Connections the pool keeps open", "size"),
+            ("db_pool_checked_out", "Connections currently in use", "checkedout"),
+            ("db_pool_overflow", "Connections opened beyond the pool size", "overflow"),
+    ):
+        lines.extend(render_gauges(metric, documentation, [
+            ({"engine": name}, getattr(bound.pool, attribute)())
+            for name, bound in engines.items() if hasattr(bound.pool, attribute)
+        ]))
+    return lines
+
+
+def info_gauges(prefix: str, documentation: str, info: Dict[str, float]) -> List[str]:
+    lines = []
+    for field, value in info.items():
+        lines.extend(render_gauges(f"{prefix}_{field}", f"{documentation}: {field.replace('_', ' ')}", [({}, value)]))
+    return lines
+
+
+@router.get("/metrics", response_class=Response, include_in_schema=False)
+async def read_metrics():
+    lines = request_duration.render() + query_duration.render() + ingested_rows.render()
+    lines += render_gauges(
+        "stats_ingest_rows_per_second", "Stats samples written per second over the last minute", [({}, ingest_rate.rate())]
+    )
+    lines += pool_gauges()
+    lines += info_gauges("stats_analysis_cache", "Analysis cache", StatsService.analysis_cache.info())
+    lines += info_gauges("device_registry", "Device registry cache", DeviceService.registry.info())
+    lines += info_gauges("stats_ingest_buffer", "Ingest buffer", ingest_buffer.info())
+    lines += info_gauges("stats_analysis_pool", "Analysis worker pool", analysis_pool.info())
+    return Response("\n".join(lines) + "\n", media_type=CONTENT_TYPE)
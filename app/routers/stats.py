@@ -1,81 +1,260 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.models.database import get_db
-from app.schemas.stats import Stats, StatsCreate, TimeRange, CompleteStatsAnalysis, UserStatsAnalysis
+from app.config import settings
+from app.models.database import get_db, release_db, run_db
+from app.responses import STATS_FIELDS, FastJSONResponse, rows_to_dicts
+from app.schemas.stats import (
+    Stats, StatsAccepted, StatsCreate, StatsBatchCreate, StatsBatchResult, StatsIngest, StatsIngestResult, TimeRange,
+    CompleteStatsAnalysis, DeviceRanking, DeviceSeries, FleetSummary, UserRanking, UserStatsAnalysis
+)
 from app.services.stats_service import StatsService
 from app.services.device_service import DeviceService
+from app.services.export_service import MEDIA_TYPES, ExportService
+from app.services.fleet_service import FleetService
+from app.services.ingest_buffer import IngestBufferFull, IngestFlushError, ingest_buffer
+from app.services.pagination import InvalidCursor, decode_timestamp_cursor, encode_cursor
+from app.services.series_service import BUCKETS, SeriesService
 from app.services.user_service import UserService
 
 router = APIRouter(prefix="/stats", tags=["statistics"])
 
+# buffered writes answer 202 in both ack modes, 201 stays reserved for the committed Stats / StatsBatchResult body
+BUFFERED_RESPONSES = {
+    202: {
+        "model": StatsAccepted,
+        "description": "Samples taken by the ingest buffer: queued, or already committed when STATS_INGEST_ACK=sync"
+    }
+}
 
-@router.post("/devices/{device_id}", response_model=Stats, status_code=201)
-def create_device_stats(
+
+async def buffer_stats(db: Session, device_pk: int, samples: List[StatsCreate]) -> JSONResponse:
+    acknowledged = settings.STATS_INGEST_ACK == "sync"
+    # the flusher takes its connection from the same pool, a request holding one while it waits could starve it
+    await release_db(db)
+    try:
+        accepted = await ingest_buffer.put(
+            device_pk,
+            samples,
+            wait_for_flush=acknowledged,
+            timeout=settings.STATS_INGEST_ENQUEUE_TIMEOUT
+        )
+    except IngestBufferFull:
+        raise HTTPException(status_code=503, detail="Ingest buffer is full", headers={"Retry-After": "1"})
+    except IngestFlushError:
+        raise HTTPException(status_code=500, detail="Failed to create stats")
+
+    return JSONResponse(status_code=202, content=StatsAccepted(accepted=accepted).model_dump())
+
+
+@router.post("/devices/{device_id}", response_model=Stats, status_code=201, responses=BUFFERED_RESPONSES)
+async def create_device_stats(
         device_id: str = Path(...),
         stats: StatsCreate = None,
         db: Session = Depends(get_db)
 ):
-    db_device = DeviceService.get_device_by_device_id(db, device_id=device_id)
+    db_device = await run_db(db, DeviceService.resolve_device, device_id=device_id)
     if db_device is None:
         raise HTTPException(status_code=404, detail="Device not found")
 
-    db_stats = StatsService.create_device_stats(db=db, device_id=device_id, stats_data=stats)
+    if settings.STATS_INGEST_BUFFER_ENABLED:
+        return await buffer_stats(db, db_device.id, [stats])
+
+    db_stats = await run_db(db, StatsService.create_device_stats, device_id=device_id, stats_data=stats)
     if db_stats is None:
         raise HTTPException(status_code=500, detail="Failed to create stats")
 
     return db_stats
 
 
+@router.post(
+    "/devices/{device_id}/batch", response_model=StatsBatchResult, status_code=201, responses=BUFFERED_RESPONSES
+)
+async def create_device_stats_batch(
+        device_id: str = Path(...),
+        batch: StatsBatchCreate = None,
+        db: Session = Depends(get_db)
+):
+    db_device = await run_db(db, DeviceService.resolve_device, device_id=device_id)
+    if db_device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    if settings.STATS_INGEST_BUFFER_ENABLED:
+        return await buffer_stats(db, db_device.id, batch.samples)
+
+    inserted = await run_db(db, StatsService.create_device_stats_batch, device_id=device_id, samples=batch.samples)
+    if inserted is None:
+        raise HTTPException(status_code=500, detail="Failed to create stats")
+
+    return StatsBatchResult(device_id=device_id, inserted=inserted)
+
+
+@router.post("/ingest", response_model=StatsIngestResult)
+async def ingest_stats(
+        ingest: StatsIngest,
+        db: Session = Depends(get_db)
+):
+    inserted, rejected = await run_db(db, StatsService.ingest_stats, records=ingest.records)
+    return StatsIngestResult(inserted=inserted, rejected=rejected)
+
+
 @router.get("/devices/{device_id}", response_model=List[Stats])
-def read_device_stats(
+async def read_device_stats(
         device_id: str = Path(...),
         start_time: Optional[datetime] = Query(None),
         end_time: Optional[datetime] = Query(None),
         skip: int = Query(0, ge=0),
         limit: int = Query(100, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
         db: Session = Depends(get_db)
 ):
-    db_device = DeviceService.get_device_by_device_id(db, device_id=device_id)
+    try:
+        after = decode_timestamp_cursor(cursor) if cursor else None
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    db_device = await run_db(db, DeviceService.resolve_device, device_id=device_id)
     if db_device is None:
         raise HTTPException(status_code=404, detail="Device not found")
 
-    stats = StatsService.get_device_stats(
-        db=db,
+    stats = await run_db(
+        db,
+        StatsService.get_device_stats,
         device_id=device_id,
         start_time=start_time,
         end_time=end_time,
         skip=skip,
-        limit=limit
+        limit=limit + 1,
+        after=after
+    )
+
+    # rows are encoded straight to JSON, response_model only documents the shape
+    headers = {}
+    if len(stats) > limit:
+        stats = stats[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(stats[-1].timestamp, stats[-1].id)
+    return FastJSONResponse(rows_to_dicts(STATS_FIELDS, stats), headers=headers)
+
+
+@router.get("/devices/{device_id}/series", response_model=DeviceSeries)
+async def read_device_series(
+        device_id: str = Path(...),
+        bucket: str = Query("1h", pattern="^(1m|1h|1d)$"),
+        start_time: Optional[datetime] = Query(None),
+        end_time: Optional[datetime] = Query(None),
+        points: Optional[int] = Query(
+            None, ge=3, le=settings.STATS_SERIES_MAX_POINTS, description="Downsample to this many buckets with LTTB"
+        ),
+        db: Session = Depends(get_db)
+):
+    db_device = await run_db(db, DeviceService.resolve_device, device_id=device_id)
+    if db_device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    buckets = await run_db(
+        db,
+        SeriesService.device_series,
+        device_pk=db_device.id,
+        granularity=BUCKETS[bucket],
+        start_time=start_time,
+        end_time=end_time
+    )
+
+    downsampled = points is not None and len(buckets) > points
+    if downsampled:
+        buckets = await run_in_threadpool(SeriesService.downsample, buckets, points)
+    elif len(buckets) > settings.STATS_SERIES_MAX_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail="Too many buckets, use a shorter period, a coarser bucket or points"
+        )
+
+    return FastJSONResponse({
+        "device_id": device_id,
+        "bucket": bucket,
+        "downsampled": downsampled,
+        "points": SeriesService.to_dicts(buckets),
+    })
+
+
+@router.get("/devices/{device_id}/export", response_class=StreamingResponse)
+async def export_device_stats(
+        device_id: str = Path(...),
+        start_time: Optional[datetime] = Query(None),
+        end_time: Optional[datetime] = Query(None),
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+        db: Session = Depends(get_db)
+):
+    db_device = await run_db(db, DeviceService.resolve_device, device_id=device_id)
+    if db_device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    return StreamingResponse(
+        ExportService.stream([(db_device.id, device_id)], start_time, end_time, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{device_id}.{format}"'}
     )
 
-    return stats
+
+@router.get("/users/{user_id}/export", response_class=StreamingResponse)
+async def export_user_stats(
+        user_id: int = Path(...),
+        start_time: Optional[datetime] = Query(None),
+        end_time: Optional[datetime] = Query(None),
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+        db: Session = Depends(get_db)
+):
+    db_user = await run_db(db, UserService.get_user, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    devices = await run_db(db, ExportService.user_devices, user_id=user_id)
+    return StreamingResponse(
+        ExportService.stream(devices, start_time, end_time, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="user_{user_id}.{format}"'}
+    )
 
 
 @router.post("/devices/{device_id}/analyze", response_model=CompleteStatsAnalysis)
-def analyze_device_stats(
+async def analyze_device_stats(
         device_id: str = Path(..., description="The device ID to analyze stats for"),
         time_range: TimeRange = None,
         db: Session = Depends(get_db)
 ):
-    db_device = DeviceService.get_device_by_device_id(db, device_id=device_id)
+    db_device = await run_db(db, DeviceService.resolve_device, device_id=device_id)
     if db_device is None:
         raise HTTPException(status_code=404, detail="Device not found")
 
     start_time = None
     end_time = None
+    approximate = False
+    percentiles = None
+    extended = False
+    histogram_bins = 10
 
     if time_range:
         start_time = time_range.start_time
         end_time = time_range.end_time
+        approximate = time_range.approximate
+        percentiles = time_range.percentiles
+        extended = time_range.extended
+        histogram_bins = time_range.histogram_bins
 
-    analysis = StatsService.analyze_device_stats(
-        db=db,
+    analysis = await run_db(
+        db,
+        StatsService.analyze_device_stats,
         device_id=device_id,
         start_time=start_time,
-        end_time=end_time
+        end_time=end_time,
+        approximate=approximate,
+        percentiles=percentiles,
+        extended=extended,
+        histogram_bins=histogram_bins
     )
 
     if analysis is None:
@@ -85,30 +264,104 @@ def analyze_device_stats(
 
 
 @router.post("/users/{user_id}/analyze", response_model=UserStatsAnalysis)
-def analyze_user_stats(
+async def analyze_user_stats(
         user_id: int = Path(...),
         time_range: TimeRange = None,
         db: Session = Depends(get_db)
 ):
-    db_user = UserService.get_user(db, user_id=user_id)
+    db_user = await run_db(db, UserService.get_user, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
     start_time = None
     end_time = None
+    approximate = False
+    percentiles = None
+    extended = False
+    histogram_bins = 10
 
     if time_range:
         start_time = time_range.start_time
         end_time = time_range.end_time
+        approximate = time_range.approximate
+        percentiles = time_range.percentiles
+        extended = time_range.extended
+        histogram_bins = time_range.histogram_bins
 
-    analysis = StatsService.analyze_user_stats(
-        db=db,
+    analysis = await run_db(
+        db,
+        StatsService.analyze_user_stats,
         user_id=user_id,
         start_time=start_time,
-        end_time=end_time
+        end_time=end_time,
+        approximate=approximate,
+        percentiles=percentiles,
+        extended=extended,
+        histogram_bins=histogram_bins
     )
 
     if analysis is None:
         raise HTTPException(status_code=404, detail="No statistics found for the specified period")
 
-    return analysis
\ No newline at end of file
+    return analysis
+
+
+@router.get("/fleet/summary", response_model=FleetSummary)
+async def read_fleet_summary(
+        start_time: Optional[datetime] = Query(None),
+        end_time: Optional[datetime] = Query(None),
+        db: Session = Depends(get_db)
+):
+    return await run_db(db, FleetService.summary, start_time=start_time, end_time=end_time)
+
+
+@router.get("/fleet/devices", response_model=List[DeviceRanking])
+async def rank_fleet_devices(
+        metric: str = Query("max", pattern="^(max|min|mean|count)$"),
+        axis: str = Query("x", pattern="^(x|y|z)$"),
+        order: str = Query("desc", pattern="^(desc|asc)$", description="desc for the top devices, asc for the bottom"),
+        limit: int = Query(10, ge=1, le=100),
+        start_time: Optional[datetime] = Query(None),
+        end_time: Optional[datetime] = Query(None),
+        db: Session = Depends(get_db)
+):
+    return await run_db(
+        db,
+        FleetService.rank_devices,
+        metric=metric,
+        axis=axis,
+        descending=order == "desc",
+        limit=limit,
+        start_time=start_time,
+        end_time=end_time
+    )
+
+
+@router.get("/fleet/users", response_model=List[UserRanking])
+async def rank_fleet_users(
+        metric: str = Query("max", pattern="^(max|min|mean|count)$"),
+        axis: str = Query("x", pattern="^(x|y|z)$"),
+        order: str = Query("desc", pattern="^(desc|asc)$", description="desc for the top users, asc for the bottom"),
+        limit: int = Query(10, ge=1, le=100),
+        start_time: Optional[datetime] = Query(None),
+        end_time: Optional[datetime] = Query(None),
+        db: Session = Depends(get_db)
+):
+    return await run_db(
+        db,
+        FleetService.rank_users,
+        metric=metric,
+        axis=axis,
+        descending=order == "desc",
+        limit=limit,
+        start_time=start_time,
+        end_time=end_time
+    )
+
+
+@router.get("/cache", response_model=Dict[str, Dict[str, Union[int, float]]])
+async def read_cache_info():
+    return {
+        "analysis": StatsService.analysis_cache.info(),
+        "device_registry": DeviceService.registry.info(),
+    }
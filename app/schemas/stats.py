@@ -1,6 +1,8 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, model_validator
+
+from app.config import settings
 
 
 class StatsCreate(BaseModel):
@@ -9,6 +11,38 @@ class StatsCreate(BaseModel):
     z: float
 
 
+class StatsBatchCreate(BaseModel):
+    samples: List[StatsCreate] = Field(..., min_length=1, max_length=settings.STATS_BATCH_MAX_SIZE)
+
+
+class StatsBatchResult(BaseModel):
+    device_id: str
+    inserted: int
+
+
+class StatsAccepted(BaseModel):
+    accepted: int
+
+
+class StatsIngestRecord(StatsCreate):
+    device_id: str
+
+
+class StatsIngest(BaseModel):
+    records: List[StatsIngestRecord] = Field(..., min_length=1, max_length=settings.STATS_BATCH_MAX_SIZE)
+
+
+class StatsIngestRejection(BaseModel):
+    index: int
+    device_id: str
+    detail: str
+
+
+class StatsIngestResult(BaseModel):
+    inserted: int
+    rejected: List[StatsIngestRejection]
+
+
 class Stats(StatsCreate):
     id: int
     device_id: int
@@ -18,9 +52,42 @@ class Stats(StatsCreate):
         from_attributes = True
 
 
+def percentile_key(percentile: float) -> str:
+    return f"p{percentile:g}"
+
+
 class TimeRange(BaseModel):
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
+    approximate: bool = False
+    percentiles: Optional[List[float]] = Field(None, max_length=20)
+    extended: bool = False
+    histogram_bins: int = Field(10, ge=1, le=1000)
+
+    @model_validator(mode="after")
+    def check_analysis_options(self):
+        if self.extended and self.approximate:
+            raise ValueError("extended statistics are only available with approximate=false")
+        if self.percentiles is not None:
+            if not self.approximate:
+                raise ValueError("percentiles are only available with approximate=true")
+            if any(percentile < 0 or percentile > 100 for percentile in self.percentiles):
+                raise ValueError("percentiles must be between 0 and 100")
+        return self
+
+
+class Histogram(BaseModel):
+    edges: List[float]
+    counts: List[int]
+
+
+class ExtendedStatsAnalysis(BaseModel):
+    mean: float
+    stddev: float
+    p5: float
+    p95: float
+    p99: float
+    histogram: Histogram
 
 
 class StatsAnalysis(BaseModel):
@@ -29,6 +96,8 @@ class StatsAnalysis(BaseModel):
     count: int
     sum: float
     median: float
+    percentiles: Optional[Dict[str, float]] = None
+    extended: Optional[ExtendedStatsAnalysis] = None
 
 
 class CompleteStatsAnalysis(BaseModel):
@@ -48,3 +117,56 @@ class UserStatsAnalysis(BaseModel):
     user_id: int
     aggregate_stats: CompleteStatsAnalysis
     device_stats: List[DeviceStatsAnalysis]
+
+
+class SeriesAxis(BaseModel):
+    min: float
+    max: float
+    avg: float
+
+
+class SeriesBucket(BaseModel):
+    bucket_start: datetime
+    count: int
+    x: SeriesAxis
+    y: SeriesAxis
+    z: SeriesAxis
+
+
+class DeviceSeries(BaseModel):
+    device_id: str
+    bucket: str
+    downsampled: bool
+    points: List[SeriesBucket]
+
+
+class FleetAxisSummary(BaseModel):
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    sum: float
+    mean: Optional[float] = None
+
+
+class FleetSummary(BaseModel):
+    device_count: int
+    count: int
+    x: FleetAxisSummary
+    y: FleetAxisSummary
+    z: FleetAxisSummary
+    period_start: Optional[datetime] = None
+    period_end: Optional[datetime] = None
+
+
+class DeviceRanking(BaseModel):
+    device_id: str
+    user_id: Optional[int] = None
+    count: int
+    value: float
+
+
+class UserRanking(BaseModel):
+    user_id: int
+    username: str
+    device_count: int
+    count: int
+    value: float
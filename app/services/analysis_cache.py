@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from app.config import settings
+
+MISSING = object()
+
+
+class AnalysisCache:
+    def __init__(self, max_size: int, ttl: float, closed_after: float, closed_ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.closed_after = closed_after
+        self.closed_ttl = closed_ttl
+        self.hits = 0
+        self.misses = 0
+        # versions move on every write, rewrites only when existing samples go away, which closed windows care about
+        self._versions: Dict[int, int] = {}
+        self._rewrites: Dict[int, int] = {}
+        self._epoch = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_closed(self, end_time: Optional[datetime]) -> bool:
+        if end_time is None:
+            return False
+        if end_time.tzinfo is not None:
+            end_time = end_time.astimezone(timezone.utc).replace(tzinfo=None)
+        # samples are stamped on arrival, a window that ended a while ago cannot receive any more of them
+        return end_time < datetime.utcnow() - timedelta(seconds=self.closed_after)
+
+    def tag(self, device_pks: Iterable[int], end_time: Optional[datetime]) -> Hashable:
+        device_pks = tuple(device_pks)
+        closed = self.is_closed(end_time)
+        with self._lock:
+            if closed:
+                return "closed", self._epoch, tuple(
+                    (device_pk, self._rewrites.get(device_pk, 0)) for device_pk in device_pks
+                )
+            return "open", self._epoch, tuple(
+                (device_pk, self._versions.get(device_pk, 0), self._rewrites.get(device_pk, 0))
+                for device_pk in device_pks
+            )
+
+    def bump(self, device_pks: Iterable[int]) -> None:
+        with self._lock:
+            for device_pk in set(device_pks):
+                self._versions[device_pk] = self._versions.get(device_pk, 0) + 1
+
+    def invalidate(self, device_pks: Iterable[int]) -> None:
+        # samples of these devices were deleted, results of closed windows are stale as well
+        with self._lock:
+            for device_pk in set(device_pks):
+                self._rewrites[device_pk] = self._rewrites.get(device_pk, 0) + 1
+
+    def invalidate_all(self) -> None:
+        # whole partitions went away, any cached result may have covered them
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def get(self, key: Hashable, tag: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != tag or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key: Hashable, tag: Hashable, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+
+        # other workers do not bump our versions, so entries also expire: open windows after the ttl, closed ones after
+        # the much longer closed_ttl, which bounds how long a delete made by another process can go unnoticed
+        expires_at = time.monotonic() + (self.closed_ttl if tag[0] == "closed" else self.ttl)
+        with self._lock:
+            self._entries[key] = (tag, expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+analysis_cache = AnalysisCache(
+    max_size=settings.STATS_ANALYSIS_CACHE_SIZE,
+    ttl=settings.STATS_ANALYSIS_CACHE_TTL,
+    closed_after=settings.STATS_ANALYSIS_CACHE_CLOSED_AFTER,
+    closed_ttl=settings.STATS_ANALYSIS_CACHE_CLOSED_TTL
+)
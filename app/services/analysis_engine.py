@@ -0,0 +1,77 @@
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+from app.schemas.stats import CompleteStatsAnalysis, ExtendedStatsAnalysis, Histogram, StatsAnalysis
+
+EXTENDED_PERCENTILES = (5, 95, 99)
+
+
+class AnalysisEngine:
+    @staticmethod
+    def fetch(db: Session, statement: Select, width: int) -> np.ndarray:
+        # the cursor is consumed straight into one float64 buffer, no per-row Python lists are built
+        values = np.fromiter(chain.from_iterable(db.execute(statement)), dtype=np.float64)
+        return values.reshape(-1, width)
+
+    @staticmethod
+    def split(matrix: np.ndarray) -> Dict[int, np.ndarray]:
+        # rows ordered by the key in column 0, every run of equal keys becomes one group
+        if not len(matrix):
+            return {}
+        boundaries = np.flatnonzero(np.diff(matrix[:, 0])) + 1
+        keys = matrix[np.concatenate(([0], boundaries)), 0].astype(np.int64)
+        return dict(zip(keys.tolist(), np.split(matrix[:, 1:], boundaries)))
+
+    @staticmethod
+    def concat(matrices: Iterable[np.ndarray], width: int) -> np.ndarray:
+        matrices = [matrix for matrix in matrices if len(matrix)]
+        if not matrices:
+            return np.empty((0, width))
+        return np.concatenate(matrices)
+
+    @staticmethod
+    def analyze(values: np.ndarray, extended: bool = False, histogram_bins: int = 10) -> StatsAnalysis:
+        if not len(values):
+            return StatsAnalysis(min_value=0.0, max_value=0.0, count=0, sum=0.0, median=0.0)
+
+        count = len(values)
+        total = float(np.sum(values))
+        analysis = StatsAnalysis(
+            min_value=float(np.min(values)),
+            max_value=float(np.max(values)),
+            count=count,
+            sum=total,
+            median=float(np.median(values))
+        )
+        if extended:
+            percentiles = np.percentile(values, EXTENDED_PERCENTILES)
+            counts, edges = np.histogram(values, bins=histogram_bins)
+            analysis.extended = ExtendedStatsAnalysis(
+                mean=total / count,
+                stddev=float(np.std(values)),
+                p5=float(percentiles[0]),
+                p95=float(percentiles[1]),
+                p99=float(percentiles[2]),
+                histogram=Histogram(edges=edges.tolist(), counts=counts.tolist())
+            )
+        return analysis
+
+    @staticmethod
+    def complete_analysis(
+            matrix: np.ndarray,
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            extended: bool = False,
+            histogram_bins: int = 10
+    ) -> CompleteStatsAnalysis:
+        x, y, z = (AnalysisEngine.analyze(matrix[:, axis], extended, histogram_bins) for axis in range(3))
+        return CompleteStatsAnalysis(x=x, y=y, z=z, period_start=start_time, period_end=end_time)
+
+    @staticmethod
+    def from_columns(columns: List[np.ndarray]) -> np.ndarray:
+        return np.column_stack(columns).astype(np.float64, copy=False)
@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+
+from app.config import settings
+from app.models.database import offload
+
+
+class AnalysisPool:
+    def __init__(self, processes: int, min_rows: int):
+        self.processes = processes
+        self.min_rows = min_rows
+        self.offloaded = 0
+        self.inline = 0
+        self.workers = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        # workers are spawned rather than forked, they must not inherit the pooled database connections
+        # 0 means one worker per CPU, the same default ProcessPoolExecutor would pick
+        self.workers = self.processes or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        # start the workers now, spawning them on the first large analysis would add their start-up to its latency
+        for _ in range(self.workers):
+            self._executor.submit(int)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self.workers = 0
+
+    def map(self, fn: Callable[..., Any], jobs: Sequence[Sequence]) -> List[Any]:
+        # the first argument of every job is the float matrix to analyze; matrices past the threshold are shipped to
+        # the workers, the rest run inline while the workers are busy
+        futures: List[Optional[Future]] = []
+        for job in jobs:
+            if self._executor is not None and len(job[0]) >= self.min_rows:
+                futures.append(self._executor.submit(fn, *job))
+            else:
+                futures.append(None)
+
+        with self._lock:
+            offloaded = sum(future is not None for future in futures)
+            self.offloaded += offloaded
+            self.inline += len(futures) - offloaded
+
+        if offloaded < len(futures):
+            # inline jobs still have to stay off the event loop when this runs through AsyncSession.run_sync
+            results = offload(lambda: [fn(*job) if future is None else None for future, job in zip(futures, jobs)])
+        else:
+            results = [None] * len(futures)
+        pending = [(index, future) for index, future in enumerate(futures) if future is not None]
+        if not pending:
+            return results
+
+        if in_greenlet():
+            # called through AsyncSession.run_sync, wait without blocking the event loop
+            done = await_only(asyncio.gather(*(asyncio.wrap_future(future) for _, future in pending)))
+        else:
+            done = [future.result() for _, future in pending]
+        for (index, _), result in zip(pending, done):
+            results[index] = result
+        return results
+
+    def info(self) -> Dict[str, int]:
+        return {
+            "processes": self.workers,
+            "min_rows": self.min_rows,
+            "offloaded": self.offloaded,
+            "inline": self.inline,
+        }
+
+
+analysis_pool = AnalysisPool(
+    processes=settings.STATS_ANALYSIS_PROCESSES,
+    min_rows=settings.STATS_ANALYSIS_OFFLOAD_MIN_ROWS
+)
@@ -0,0 +1,221 @@
+import os
+import shutil
+from itertools import groupby
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.stats import Stats
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("timestamp", pa.timestamp("us")),
+    ("x", pa.float64()),
+    ("y", pa.float64()),
+    ("z", pa.float64()),
+])
+
+
+def _month_start(timestamp: datetime) -> datetime:
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month_start(start: datetime) -> datetime:
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def _naive_utc(timestamp: Optional[datetime]) -> Optional[datetime]:
+    # archived timestamps are naive UTC like the column they came from, aware bounds cannot be compared with them
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+class ArchiveService:
+    @staticmethod
+    def enabled() -> bool:
+        return bool(settings.STATS_ARCHIVE_PATH)
+
+    @staticmethod
+    def device_dir(device_pk: int) -> Path:
+        return Path(settings.STATS_ARCHIVE_PATH) / f"device_{device_pk}"
+
+    @staticmethod
+    def month_path(device_pk: int, month_start: datetime) -> Path:
+        return ArchiveService.device_dir(device_pk) / f"{month_start:%Y_%m}.parquet"
+
+    @staticmethod
+    def month_range(path: Path) -> Tuple[datetime, datetime]:
+        month_start = datetime.strptime(path.stem, "%Y_%m")
+        return month_start, _next_month_start(month_start)
+
+    @staticmethod
+    def device_pks() -> List[int]:
+        if not ArchiveService.enabled():
+            return []
+
+        root = Path(settings.STATS_ARCHIVE_PATH)
+        if not root.is_dir():
+            return []
+        return sorted(int(path.name[len("device_"):]) for path in root.glob("device_*") if path.is_dir())
+
+    @staticmethod
+    def archived_paths(device_pk: int, start_time: Optional[datetime], end_time: Optional[datetime]) -> List[Path]:
+        if not ArchiveService.enabled():
+            return []
+
+        start_time = _naive_utc(start_time)
+        end_time = _naive_utc(end_time)
+        directory = ArchiveService.device_dir(device_pk)
+        if not directory.is_dir():
+            return []
+
+        paths = []
+        for path in sorted(directory.glob("*.parquet")):
+            month_start, month_end = ArchiveService.month_range(path)
+            if end_time and month_start > end_time:
+                continue
+            if start_time and month_end <= start_time:
+                continue
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def read(
+            device_pk: int,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None,
+            columns: Optional[List[str]] = None,
+            include_end: bool = True
+    ) -> Optional[pa.Table]:
+        tables = [
+            ArchiveService.read_file(path, start_time, end_time, columns, include_end)
+            for path in ArchiveService.archived_paths(device_pk, start_time, end_time)
+        ]
+        if not tables:
+            return None
+        return pa.concat_tables(tables)
+
+    @staticmethod
+    def read_file(
+            path: Path,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None,
+            columns: Optional[List[str]] = None,
+            include_end: bool = True
+    ) -> pa.Table:
+        start_time = _naive_utc(start_time)
+        end_time = _naive_utc(end_time)
+        filters = []
+        if start_time:
+            filters.append(("timestamp", ">=", start_time))
+        if end_time:
+            filters.append(("timestamp", "<=" if include_end else "<", end_time))
+
+        # files are sorted by timestamp, so the row group statistics let the filter skip most of a partial month
+        return pq.read_table(path, columns=columns, filters=filters or None, memory_map=True)
+
+    @staticmethod
+    def cutoff(now: datetime, older_than_days: Optional[int] = None) -> datetime:
+        if older_than_days is None:
+            older_than_days = settings.STATS_ARCHIVE_AFTER_DAYS
+        # only whole months are archived, so every file is written once
+        return _month_start(now - timedelta(days=older_than_days))
+
+    @staticmethod
+    def archive(db: Session, now: Optional[datetime] = None, older_than_days: Optional[int] = None) -> Dict[str, int]:
+        cutoff = ArchiveService.cutoff(now or datetime.utcnow(), older_than_days)
+        result = {"files": 0, "rows": 0}
+
+        device_pks = [pk for (pk,) in db.query(Stats.device_id).filter(Stats.timestamp < cutoff).distinct()]
+        for device_pk in device_pks:
+            statement = select(Stats.id, Stats.timestamp, Stats.x, Stats.y, Stats.z).filter(
+                Stats.device_id == device_pk, Stats.timestamp < cutoff
+            ).order_by(Stats.timestamp, Stats.id).execution_options(yield_per=settings.STATS_EXPORT_CHUNK_SIZE)
+
+            month_file = None
+            for rows in db.execute(statement).partitions():
+                for row_month, month_rows in groupby(rows, key=lambda row: _month_start(row.timestamp)):
+                    if month_file is not None and month_file.month_start != row_month:
+                        result["rows"] += month_file.close()
+                        result["files"] += 1
+                        month_file = None
+                    if month_file is None:
+                        month_file = MonthFile(device_pk, row_month)
+                    month_file.write(list(month_rows))
+            if month_file is not None:
+                result["rows"] += month_file.close()
+                result["files"] += 1
+
+            # the files are on disk before the rows go, a crash in between only leaves rows to archive again
+            db.query(Stats).filter(Stats.device_id == device_pk, Stats.timestamp < cutoff).delete(
+                synchronize_session=False
+            )
+            db.commit()
+
+        return result
+
+    @staticmethod
+    def remove_device(device_pk: int) -> None:
+        if ArchiveService.enabled():
+            shutil.rmtree(ArchiveService.device_dir(device_pk), ignore_errors=True)
+
+
+class MonthFile:
+    # rows arrive in timestamp order and are written one row group at a time, memory stays at a row group
+    # however large the month is
+    def __init__(self, device_pk: int, month_start: datetime):
+        self.month_start = month_start
+        self.path = ArchiveService.month_path(device_pk, month_start)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.temporary = self.path.with_suffix(".parquet.tmp")
+        self.writer = pq.ParquetWriter(self.temporary, ARCHIVE_SCHEMA, compression="zstd", write_statistics=True)
+        self.pending: List[pa.RecordBatch] = []
+        self.pending_rows = 0
+        self.rows = 0
+        # a file left by a run that stopped before deleting its rows is kept, only the rows missing from it are added
+        self.existing = pq.read_table(self.path) if self.path.exists() else None
+
+    def write(self, rows: List) -> None:
+        batch = pa.RecordBatch.from_pydict({
+            "id": [row.id for row in rows],
+            "timestamp": [row.timestamp for row in rows],
+            "x": [row.x for row in rows],
+            "y": [row.y for row in rows],
+            "z": [row.z for row in rows],
+        }, schema=ARCHIVE_SCHEMA)
+        self.rows += len(rows)
+        if self.existing is not None:
+            batch = batch.filter(pc.invert(pc.is_in(batch["id"], value_set=self.existing["id"])))
+
+        self.pending.append(batch)
+        self.pending_rows += batch.num_rows
+        if self.existing is None and self.pending_rows >= settings.STATS_ARCHIVE_ROW_GROUP_SIZE:
+            self._flush()
+
+    def close(self) -> int:
+        if self.existing is not None:
+            # the missing rows are late arrivals that can fall anywhere in the month, merge them in timestamp order
+            table = pa.concat_tables([self.existing, pa.Table.from_batches(self.pending, schema=ARCHIVE_SCHEMA)])
+            self.pending = table.sort_by([("timestamp", "ascending"), ("id", "ascending")]).to_batches()
+            self.pending_rows = table.num_rows
+        while self.pending_rows:
+            self._flush()
+        self.writer.close()
+        os.replace(self.temporary, self.path)
+        return self.rows
+
+    def _flush(self) -> None:
+        table = pa.Table.from_batches(self.pending, schema=ARCHIVE_SCHEMA)
+        size = settings.STATS_ARCHIVE_ROW_GROUP_SIZE
+        self.writer.write_table(table.slice(0, size), row_group_size=size)
+        rest = table.slice(size)
+        self.pending = rest.to_batches()
+        self.pending_rows = rest.num_rows
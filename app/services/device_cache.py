@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class DeviceRef(NamedTuple):
+    id: int
+    user_id: Optional[int]
+
+
+class DeviceRegistryCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, DeviceRef]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, device_id: str) -> Optional[DeviceRef]:
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[device_id]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(device_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, device_id: str, ref: DeviceRef) -> None:
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[device_id] = (time.monotonic() + self.ttl, ref)
+            self._entries.move_to_end(device_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, device_id: str) -> None:
+        with self._lock:
+            self._entries.pop(device_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
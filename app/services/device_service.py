@@ -1,14 +1,24 @@
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.models.device import Device
+from app.models.stats import Stats
 from app.schemas.device import DeviceCreate, DeviceUpdate
+from app.services.analysis_cache import analysis_cache
+from app.services.archive_service import ArchiveService
+from app.services.device_cache import DeviceRef, DeviceRegistryCache
 
 
 class DeviceService:
+    registry = DeviceRegistryCache(max_size=settings.DEVICE_CACHE_SIZE, ttl=settings.DEVICE_CACHE_TTL)
+
     @staticmethod
-    def get_devices(db: Session, skip: int = 0, limit: int = 100) -> List[Device]:
-        return db.query(Device).offset(skip).limit(limit).all()
+    def get_devices(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[Device]:
+        query = db.query(Device)
+        if after_id is not None:
+            query = query.filter(Device.id > after_id)
+        return query.order_by(Device.id).offset(skip).limit(limit).all()
 
     @staticmethod
     def get_device_by_id(db: Session, device_id: int) -> Optional[Device]:
@@ -18,6 +28,39 @@ class DeviceService:
     def get_device_by_device_id(db: Session, device_id: str) -> Optional[Device]:
         return db.query(Device).filter(Device.device_id == device_id).first()
 
+    @staticmethod
+    def resolve_device(db: Session, device_id: str) -> Optional[DeviceRef]:
+        ref = DeviceService.registry.get(device_id)
+        if ref is not None:
+            return ref
+
+        row = db.query(Device.id, Device.user_id).filter(Device.device_id == device_id).first()
+        if row is None:
+            return None
+
+        ref = DeviceRef(id=row.id, user_id=row.user_id)
+        DeviceService.registry.set(device_id, ref)
+        return ref
+
+    @staticmethod
+    def get_device_pks_by_device_ids(db: Session, device_ids: Iterable[str]) -> Dict[str, int]:
+        device_pks = {}
+        missing = set()
+        for device_id in set(device_ids):
+            ref = DeviceService.registry.get(device_id)
+            if ref is None:
+                missing.add(device_id)
+            else:
+                device_pks[device_id] = ref.id
+
+        if missing:
+            rows = db.query(Device.device_id, Device.id, Device.user_id).filter(Device.device_id.in_(missing)).all()
+            for row in rows:
+                DeviceService.registry.set(row.device_id, DeviceRef(id=row.id, user_id=row.user_id))
+                device_pks[row.device_id] = row.id
+
+        return device_pks
+
     @staticmethod
     def get_devices_by_user_id(db: Session, user_id: int) -> List[Device]:
         return db.query(Device).filter(Device.user_id == user_id).all()
@@ -45,15 +88,25 @@ class DeviceService:
             setattr(db_device, key, value)
 
         db.commit()
+        DeviceService.registry.invalidate(db_device.device_id)
         db.refresh(db_device)
         return db_device
 
+    @staticmethod
+    def delete_stats(db: Session, device_pks: List[int]) -> None:
+        if device_pks:
+            db.query(Stats).filter(Stats.device_id.in_(device_pks)).delete(synchronize_session=False)
+            analysis_cache.invalidate(device_pks)
+
     @staticmethod
     def delete_device(db: Session, device_id: int) -> bool:
         db_device = DeviceService.get_device_by_id(db, device_id)
         if not db_device:
             return False
 
+        DeviceService.delete_stats(db, [db_device.id])
         db.delete(db_device)
         db.commit()
+        DeviceService.registry.invalidate(db_device.device_id)
+        ArchiveService.remove_device(device_id)
         return True
\ No newline at end of file
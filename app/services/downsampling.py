@@ -0,0 +1,38 @@
+import numpy as np
+
+
+def lttb(times: np.ndarray, values: np.ndarray, threshold: int) -> np.ndarray:
+    # largest-triangle-three-buckets, returns the indices of the kept points. values has one column per series,
+    # each scaled to its range, and the triangle areas are summed over the columns so one selection fits all of them
+    count = len(times)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    values = values.reshape(count, -1)
+    spread = np.ptp(values, axis=0)
+    values = (values - values.min(axis=0)) / np.where(spread > 0, spread, 1)
+
+    # the first and last points are always kept, the others are split into threshold - 2 buckets
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = count - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = count - 1, count
+        next_time = times[next_start:next_end].mean()
+        next_values = values[next_start:next_end].mean(axis=0)
+
+        areas = np.abs(
+            (times[previous] - next_time) * (values[start:end] - values[previous])
+            - (times[previous] - times[start:end, None]) * (next_values - values[previous])
+        ).sum(axis=1)
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
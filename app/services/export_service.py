@@ -0,0 +1,118 @@
+import csv
+import io
+from datetime import datetime
+from itertools import repeat
+from typing import AsyncIterator, List, Optional, Tuple
+
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import Row, Select, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models.database import stream_rows
+from app.models.device import Device
+from app.models.stats import Stats
+from app.services.archive_service import ARCHIVE_SCHEMA, ArchiveService
+from app.services.stats_service import StatsService
+
+EXPORT_COLUMNS = ("device_id", "id", "timestamp", "x", "y", "z")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class ExportService:
+    @staticmethod
+    def device_statement(
+            device_pk: int,
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            after: Optional[datetime] = None,
+            before: Optional[datetime] = None
+    ) -> Select:
+        statement = ExportService._select().filter(Stats.device_id == device_pk)
+        if after:
+            statement = statement.filter(Stats.timestamp >= after)
+        if before:
+            statement = statement.filter(Stats.timestamp < before)
+        return StatsService._filter_time_range(statement, start_time, end_time).order_by(Stats.timestamp, Stats.id)
+
+    @staticmethod
+    def user_devices(db: Session, user_id: int) -> List[Tuple[int, str]]:
+        return [
+            (device_pk, device_id)
+            for device_pk, device_id in db.query(Device.id, Device.device_id).filter(
+                Device.user_id == user_id
+            ).order_by(Device.id)
+        ]
+
+    @staticmethod
+    def _select() -> Select:
+        return select(Device.device_id, Stats.id, Stats.timestamp, Stats.x, Stats.y, Stats.z).join(
+            Device, Device.id == Stats.device_id
+        )
+
+    @staticmethod
+    async def stream(
+            devices: List[Tuple[int, str]],
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            export_format: str
+    ) -> AsyncIterator[bytes]:
+        encode = ExportService.csv_chunk if export_format == "csv" else ExportService.ndjson_chunk
+        chunk_size = settings.STATS_EXPORT_CHUNK_SIZE
+        if export_format == "csv":
+            yield (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+
+        # device by device in timestamp order: the device_id prefix of the stats index fetches one device at a time
+        for device_pk, device_id in devices:
+            after = None
+            # archived months are older than anything left in the table, they come first
+            for path in ArchiveService.archived_paths(device_pk, start_time, end_time):
+                month_start, month_end = ArchiveService.month_range(path)
+                table = await run_in_threadpool(ArchiveService.read_file, path, start_time, end_time)
+                statement = ExportService.device_statement(device_pk, start_time, end_time, month_start, month_end)
+                leftover = [row async for rows in stream_rows(statement, chunk_size) for row in rows]
+                table = ExportService._merge_leftover(table, leftover)
+                for offset in range(0, table.num_rows, chunk_size):
+                    yield encode(ExportService._table_rows(device_id, table.slice(offset, chunk_size)))
+                after = month_end
+
+            statement = ExportService.device_statement(device_pk, start_time, end_time, after)
+            async for rows in stream_rows(statement, chunk_size):
+                yield encode(rows)
+
+    @staticmethod
+    def _merge_leftover(table: pa.Table, rows: List[Row]) -> pa.Table:
+        # rows of an archived month still in the table were left by an archive run that stopped before deleting
+        # them, or arrived late; the copies already in the file are skipped, the rest are merged in timestamp order
+        if not rows:
+            return table
+        leftover = pa.Table.from_pydict(
+            {column: [getattr(row, column) for row in rows] for column in ARCHIVE_SCHEMA.names}, schema=ARCHIVE_SCHEMA
+        )
+        leftover = leftover.filter(pc.invert(pc.is_in(leftover["id"], value_set=table["id"])))
+        return pa.concat_tables([table, leftover]).sort_by([("timestamp", "ascending"), ("id", "ascending")])
+
+    @staticmethod
+    def _table_rows(device_id: str, table: pa.Table) -> List[Tuple]:
+        return list(zip(repeat(device_id), *(table[column].to_pylist() for column in ARCHIVE_SCHEMA.names)))
+
+    @staticmethod
+    def ndjson_chunk(rows: List[Row]) -> bytes:
+        return b"".join(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+
+    @staticmethod
+    def csv_chunk(rows: List[Row]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(
+            (device_id, stats_id, timestamp.isoformat(), repr(x), repr(y), repr(z))
+            for device_id, stats_id, timestamp, x, y, z in rows
+        )
+        return buffer.getvalue().encode()
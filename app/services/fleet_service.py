@@ -0,0 +1,196 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import Float, Integer, Subquery, column, func, select, union_all, values
+from sqlalchemy.orm import Session
+
+from app.models.database import offload
+from app.models.device import Device
+from app.models.rollup import StatsRollup
+from app.models.stats import Stats
+from app.models.user import User
+from app.schemas.stats import DeviceRanking, FleetAxisSummary, FleetSummary, UserRanking
+from app.services.archive_service import ArchiveService
+from app.services.rollup_service import AXES, RawSegment, RollupService
+from app.services.stats_service import StatsService
+
+
+class FleetService:
+    @staticmethod
+    def summary(db: Session, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> FleetSummary:
+        totals = FleetService._device_totals(db, start_time, end_time)
+        row = db.execute(
+            select(
+                func.count(),
+                func.sum(totals.c.count),
+                *FleetService._combined_columns(totals)
+            )
+        ).one()
+
+        count = int(row[1] or 0)
+        axes = {}
+        for index, axis in enumerate(AXES):
+            total, min_value, max_value = row[2 + index * 3:5 + index * 3]
+            axes[axis] = FleetAxisSummary(
+                min_value=min_value,
+                max_value=max_value,
+                sum=total or 0.0,
+                mean=total / count if count else None
+            )
+        return FleetSummary(device_count=row[0], count=count, period_start=start_time, period_end=end_time, **axes)
+
+    @staticmethod
+    def rank_devices(
+            db: Session,
+            metric: str,
+            axis: str,
+            descending: bool = True,
+            limit: int = 10,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None
+    ) -> List[DeviceRanking]:
+        totals = FleetService._device_totals(db, start_time, end_time)
+        value = FleetService._metric(totals, metric, axis)
+        statement = select(Device.device_id, Device.user_id, totals.c.count, value).join(
+            totals, totals.c.device_id == Device.id
+        ).order_by(value.desc() if descending else value.asc(), Device.id).limit(limit)
+
+        return [
+            DeviceRanking(device_id=row[0], user_id=row[1], count=row[2], value=row[3])
+            for row in db.execute(statement)
+        ]
+
+    @staticmethod
+    def rank_users(
+            db: Session,
+            metric: str,
+            axis: str,
+            descending: bool = True,
+            limit: int = 10,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None
+    ) -> List[UserRanking]:
+        devices = FleetService._device_totals(db, start_time, end_time)
+        totals = select(
+            Device.user_id,
+            func.count().label("device_count"),
+            func.sum(devices.c.count).label("count"),
+            *FleetService._combined_columns(devices)
+        ).join(devices, devices.c.device_id == Device.id).filter(
+            Device.user_id.isnot(None)
+        ).group_by(Device.user_id).subquery()
+
+        value = FleetService._metric(totals, metric, axis)
+        statement = select(User.id, User.username, totals.c.device_count, totals.c.count, value).join(
+            totals, totals.c.user_id == User.id
+        ).order_by(value.desc() if descending else value.asc(), User.id).limit(limit)
+
+        return [
+            UserRanking(user_id=row[0], username=row[1], device_count=row[2], count=row[3], value=row[4])
+            for row in db.execute(statement)
+        ]
+
+    @staticmethod
+    def _metric(totals: Subquery, metric: str, axis: str):
+        if metric == "count":
+            return totals.c.count
+        if metric == "mean":
+            return totals.c[f"{axis}_sum"] / totals.c.count
+        return totals.c[f"{axis}_{metric}"]
+
+    @staticmethod
+    def _device_totals(db: Session, start_time: Optional[datetime], end_time: Optional[datetime]) -> Subquery:
+        # one row per device; whole minutes come from the rollups and only the edges of the period scan raw samples
+        if RollupService.enabled(db):
+            rollup_segments, raw_segments = RollupService.plan(start_time, end_time)
+        else:
+            rollup_segments, raw_segments = [], None
+
+        partials = []
+        if rollup_segments:
+            partials.append(
+                select(
+                    StatsRollup.device_id,
+                    func.sum(StatsRollup.count).label("count"),
+                    *FleetService._axis_columns(StatsRollup, "{axis}_sum", "{axis}_min", "{axis}_max")
+                ).filter(RollupService.rollup_condition(rollup_segments)).group_by(StatsRollup.device_id)
+            )
+        if raw_segments is None or raw_segments:
+            statement = select(
+                Stats.device_id,
+                func.count(Stats.id).label("count"),
+                *FleetService._axis_columns(Stats, "{axis}", "{axis}", "{axis}")
+            ).group_by(Stats.device_id)
+            if raw_segments:
+                statement = statement.filter(RollupService.raw_condition(raw_segments))
+            else:
+                statement = StatsService._filter_time_range(statement, start_time, end_time)
+            partials.append(statement)
+
+        # rollups outlive the archived rows, the raw part of the period has to read the archive as well
+        archive_segments = raw_segments
+        if raw_segments is None:
+            archive_segments = [RawSegment(start=start_time, end=end_time, include_end=True)]
+        archived = offload(FleetService._archived_totals, archive_segments)
+        if archived:
+            partials.append(select(*values(
+                column("device_id", Integer),
+                column("count", Integer),
+                *[
+                    column(f"{axis}_{name}", Float)
+                    for axis in AXES
+                    for name in ("sum", "min", "max")
+                ],
+                name="archived_totals"
+            ).data(archived).c))
+
+        if len(partials) == 1:
+            return partials[0].subquery()
+
+        combined = union_all(*partials).subquery()
+        return select(
+            combined.c.device_id,
+            func.sum(combined.c.count).label("count"),
+            *FleetService._combined_columns(combined)
+        ).group_by(combined.c.device_id).subquery()
+
+    @staticmethod
+    def _archived_totals(segments: List[RawSegment]) -> List[Tuple]:
+        totals = []
+        for device_pk in ArchiveService.device_pks():
+            tables = [
+                ArchiveService.read(device_pk, segment.start, segment.end, list(AXES), segment.include_end)
+                for segment in segments
+            ]
+            tables = [table for table in tables if table is not None and table.num_rows]
+            if not tables:
+                continue
+
+            table = pa.concat_tables(tables)
+            row = [device_pk, table.num_rows]
+            for axis in AXES:
+                extremes = pc.min_max(table[axis])
+                row.extend((pc.sum(table[axis]).as_py(), extremes["min"].as_py(), extremes["max"].as_py()))
+            totals.append(tuple(row))
+        return totals
+
+    @staticmethod
+    def _axis_columns(model, sum_column: str, min_column: str, max_column: str) -> list:
+        return [
+            aggregate(getattr(model, column.format(axis=axis))).label(f"{axis}_{name}")
+            for axis in AXES
+            for aggregate, column, name in (
+                (func.sum, sum_column, "sum"), (func.min, min_column, "min"), (func.max, max_column, "max")
+            )
+        ]
+
+    @staticmethod
+    def _combined_columns(partials: Subquery) -> list:
+        # sums add up, minimums and maximums of the partial rows combine into those of the whole
+        return [
+            aggregate(partials.c[f"{axis}_{name}"]).label(f"{axis}_{name}")
+            for axis in AXES
+            for aggregate, name in ((func.sum, "sum"), (func.min, "min"), (func.max, "max"))
+        ]
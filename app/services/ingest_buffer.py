@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from app.config import settings
+from app.models.database import run_db, session_scope
+from app.schemas.stats import StatsCreate
+from app.services.stats_service import StatsService
+
+logger = logging.getLogger(__name__)
+
+
+class IngestBufferFull(Exception):
+    pass
+
+
+class IngestFlushError(Exception):
+    pass
+
+
+class _Entry(NamedTuple):
+    rows: List[Dict]
+    flushed: Optional[asyncio.Future]
+    attempts: int = 0
+
+
+class IngestBuffer:
+    def __init__(self, max_size: int, flush_size: int, flush_interval: float, flush_attempts: int):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.flush_attempts = flush_attempts
+        self.size = 0
+        self.flushed = 0
+        self.retried = 0
+        self.dropped = 0
+        self._entries: List[_Entry] = []
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def start(self) -> None:
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        # stop accepting samples and let the flusher write everything that is still queued
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def put(
+            self,
+            device_pk: int,
+            samples: List[StatsCreate],
+            wait_for_flush: bool = False,
+            timeout: float = 0
+    ) -> int:
+        timestamp = datetime.utcnow()
+        rows = [
+            {"device_id": device_pk, "timestamp": timestamp, "x": sample.x, "y": sample.y, "z": sample.z}
+            for sample in samples
+        ]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # an empty buffer takes any batch, otherwise a batch bigger than the buffer could never be queued
+        while self._closed or (self.size and self.size + len(rows) > self.max_size):
+            remaining = deadline - loop.time()
+            if self._closed or remaining <= 0:
+                raise IngestBufferFull()
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise IngestBufferFull()
+
+        entry = _Entry(rows=rows, flushed=loop.create_future() if wait_for_flush else None)
+        self._entries.append(entry)
+        self.size += len(rows)
+        if self.size >= self.flush_size:
+            self._wakeup.set()
+
+        if entry.flushed is not None:
+            await entry.flushed
+        return len(rows)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._entries:
+                taken = 0
+                batch = []
+                while self._entries and (not batch or taken + len(self._entries[0].rows) <= self.flush_size):
+                    entry = self._entries.pop(0)
+                    batch.append(entry)
+                    taken += len(entry.rows)
+                if not await self._write(batch, taken):
+                    # the failed batch is queued again, it is retried on the next flush rather than in a tight loop
+                    return
+
+    async def _write(self, batch: List[_Entry], taken: int) -> bool:
+        rows = [row for entry in batch for row in entry.rows]
+        try:
+            async with session_scope() as db:
+                written = await run_db(db, StatsService.write_rows, rows)
+        except Exception:
+            retry = [entry._replace(attempts=entry.attempts + 1) for entry in batch]
+            failed = [entry for entry in retry if entry.attempts >= self.flush_attempts]
+            retry = [entry for entry in retry if entry.attempts < self.flush_attempts]
+            retried = sum(len(entry.rows) for entry in retry)
+            logger.exception("Failed to flush %d buffered stats samples, %d will be retried", taken, retried)
+            # retried samples keep their place at the head of the queue and their share of the buffer size
+            self._entries[:0] = retry
+            self.retried += retried
+            self.dropped += taken - retried
+            taken -= retried
+            for entry in failed:
+                if entry.flushed is not None and not entry.flushed.done():
+                    entry.flushed.set_exception(IngestFlushError())
+            return False
+        else:
+            self.flushed += written
+            self.dropped += taken - written
+            for entry in batch:
+                if entry.flushed is not None and not entry.flushed.done():
+                    entry.flushed.set_result(None)
+            return True
+        finally:
+            self.size -= taken
+            self._space.set()
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+        # every failed attempt counts against the entries it held, so this ends once they are written or dropped
+        while self._entries:
+            await self.flush()
+            if self._entries:
+                await asyncio.sleep(self.flush_interval)
+
+    def info(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "max_size": self.max_size,
+            "flushed": self.flushed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+        }
+
+
+ingest_buffer = IngestBuffer(
+    max_size=settings.STATS_INGEST_BUFFER_SIZE,
+    flush_size=settings.STATS_INGEST_FLUSH_SIZE,
+    flush_interval=settings.STATS_INGEST_FLUSH_INTERVAL,
+    flush_attempts=settings.STATS_INGEST_FLUSH_ATTEMPTS
+)
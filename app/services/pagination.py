@@ -0,0 +1,41 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values: Any) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> List[Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(payload, list):
+        raise InvalidCursor(cursor)
+    return payload
+
+
+def decode_id_cursor(cursor: str) -> int:
+    payload = _decode(cursor)
+    if len(payload) != 1 or type(payload[0]) is not int:
+        raise InvalidCursor(cursor)
+    return payload[0]
+
+
+def decode_timestamp_cursor(cursor: str) -> Tuple[datetime, int]:
+    payload = _decode(cursor)
+    if len(payload) != 2 or not isinstance(payload[0], str) or type(payload[1]) is not int:
+        raise InvalidCursor(cursor)
+    try:
+        return datetime.fromisoformat(payload[0]), payload[1]
+    except ValueError:
+        raise InvalidCursor(cursor)
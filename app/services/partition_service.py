@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models.database import SessionLocal
+from app.services.analysis_cache import analysis_cache
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "stats"
+DEFAULT_PARTITION = "stats_default"
+MAINTENANCE_LOCK_ID = 7240115
+
+_BOUND_PATTERN = re.compile(r"FOR VALUES FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    start: datetime
+    end: datetime
+
+
+class PartitionService:
+    @staticmethod
+    def interval_start(timestamp: datetime, interval: Optional[str] = None) -> datetime:
+        interval = interval or settings.STATS_PARTITION_INTERVAL
+        day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+        if interval == "month":
+            return day.replace(day=1)
+        if interval == "week":
+            return day - timedelta(days=day.weekday())
+        if interval == "day":
+            return day
+        raise ValueError(f"Unsupported partition interval: {interval}")
+
+    @staticmethod
+    def next_interval_start(start: datetime, interval: Optional[str] = None) -> datetime:
+        interval = interval or settings.STATS_PARTITION_INTERVAL
+        if interval == "month":
+            return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+        if interval == "week":
+            return start + timedelta(days=7)
+        if interval == "day":
+            return start + timedelta(days=1)
+        raise ValueError(f"Unsupported partition interval: {interval}")
+
+    @staticmethod
+    def partition_name(start: datetime, interval: Optional[str] = None) -> str:
+        interval = interval or settings.STATS_PARTITION_INTERVAL
+        if interval == "month":
+            return f"{PARENT_TABLE}_p{start:%Y_%m}"
+        return f"{PARENT_TABLE}_p{start:%Y_%m_%d}"
+
+    @staticmethod
+    def is_partitioned(db) -> bool:
+        if db.get_bind().dialect.name != "postgresql":
+            return False
+
+        return db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+        ), {"table": PARENT_TABLE}).scalar()
+
+    @staticmethod
+    def get_partitions(db) -> List[Partition]:
+        rows = db.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ), {"table": PARENT_TABLE}).all()
+
+        partitions = []
+        for name, bound in rows:
+            match = _BOUND_PATTERN.search(bound or "")
+            if match:
+                partitions.append(Partition(
+                    name=name,
+                    start=datetime.fromisoformat(match.group(1)),
+                    end=datetime.fromisoformat(match.group(2))
+                ))
+        return sorted(partitions, key=lambda partition: partition.start)
+
+    @staticmethod
+    def create_default_partition(db) -> None:
+        db.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+
+    @staticmethod
+    def create_partition(db, start: datetime, end: datetime, name: str) -> None:
+        # rows that landed in the default partition for this range have to leave it before the attach
+        db.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)"))
+        if db.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": DEFAULT_PARTITION}).scalar():
+            db.execute(text(
+                f"WITH moved AS ("
+                f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end RETURNING *"
+                f") INSERT INTO {name} SELECT * FROM moved"
+            ), {"start": start, "end": end})
+        db.execute(text(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start.isoformat(' ')}') "
+            f"TO ('{end.isoformat(' ')}')"
+        ))
+
+    @staticmethod
+    def ensure_partitions(db, start: datetime, end: datetime) -> List[str]:
+        existing = PartitionService.get_partitions(db)
+        created = []
+
+        partition_start = PartitionService.interval_start(start)
+        while partition_start < end:
+            partition_end = PartitionService.next_interval_start(partition_start)
+            overlaps = any(
+                partition.start < partition_end and partition_start < partition.end for partition in existing
+            )
+            if not overlaps:
+                name = PartitionService.partition_name(partition_start)
+                PartitionService.create_partition(db, partition_start, partition_end, name)
+                existing.append(Partition(name=name, start=partition_start, end=partition_end))
+                created.append(name)
+            partition_start = partition_end
+
+        return created
+
+    @staticmethod
+    def expire_partitions(db, now: datetime) -> List[str]:
+        if settings.STATS_PARTITION_RETENTION <= 0:
+            return []
+
+        cutoff = PartitionService.interval_start(now)
+        for _ in range(settings.STATS_PARTITION_RETENTION):
+            cutoff = PartitionService.interval_start(cutoff - timedelta(days=1))
+
+        expired = []
+        for partition in PartitionService.get_partitions(db):
+            if partition.end > cutoff:
+                continue
+
+            if settings.STATS_PARTITION_EXPIRE_ACTION == "drop":
+                db.execute(text(f"DROP TABLE {partition.name}"))
+            else:
+                db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {partition.name}"))
+            expired.append(partition.name)
+        return expired
+
+    @staticmethod
+    def run_maintenance(db, now: Optional[datetime] = None) -> Dict[str, List[str]]:
+        result = {"created": [], "expired": []}
+        if not PartitionService.is_partitioned(db):
+            return result
+
+        # several workers may run maintenance at the same time, only one of them does the DDL
+        if not db.execute(text("SELECT pg_try_advisory_xact_lock(:lock_id)"), {"lock_id": MAINTENANCE_LOCK_ID}).scalar():
+            return result
+
+        now = now or datetime.utcnow()
+        end = PartitionService.interval_start(now)
+        for _ in range(settings.STATS_PARTITION_PREMAKE + 1):
+            end = PartitionService.next_interval_start(end)
+
+        result["created"] = PartitionService.ensure_partitions(db, now, end)
+        result["expired"] = PartitionService.expire_partitions(db, now)
+        db.commit()
+        if result["expired"]:
+            analysis_cache.invalidate_all()
+        return result
+
+
+def run_partition_maintenance() -> Dict[str, List[str]]:
+    db = SessionLocal()
+    try:
+        return PartitionService.run_maintenance(db)
+    finally:
+        db.close()
+
+
+async def partition_maintenance_loop(interval: float) -> None:
+    while True:
+        try:
+            result = await run_in_threadpool(run_partition_maintenance)
+            if result["created"] or result["expired"]:
+                logger.info("Stats partitions created: %s, expired: %s", result["created"], result["expired"])
+        except Exception:
+            logger.exception("Stats partition maintenance failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,300 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.rollup import StatsRollup
+from app.models.stats import Stats
+
+GRANULARITIES = ("minute", "hour", "day")
+
+# 13 bind parameters per bucket, a chunk stays well below the 32767 parameters asyncpg and SQLite accept
+UPSERT_CHUNK_SIZE = 1000
+
+_WIDTHS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+AXES = ("x", "y", "z")
+
+
+class RollupSegment(NamedTuple):
+    granularity: str
+    start: Optional[datetime]
+    end: Optional[datetime]
+
+
+class RawSegment(NamedTuple):
+    start: Optional[datetime]
+    end: Optional[datetime]
+    include_end: bool
+
+
+class AxisSummary(NamedTuple):
+    sum: float
+    min: float
+    max: float
+
+
+class RollupSummary(NamedTuple):
+    count: int
+    x: AxisSummary
+    y: AxisSummary
+    z: AxisSummary
+
+
+class RollupService:
+    @staticmethod
+    def enabled(db: Session) -> bool:
+        return settings.STATS_ROLLUPS_ENABLED and db.get_bind().dialect.name in ("postgresql", "sqlite")
+
+    @staticmethod
+    def floor(timestamp: datetime, granularity: str) -> datetime:
+        if granularity == "minute":
+            return timestamp.replace(second=0, microsecond=0)
+        if granularity == "hour":
+            return timestamp.replace(minute=0, second=0, microsecond=0)
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def ceil(timestamp: datetime, granularity: str) -> datetime:
+        floored = RollupService.floor(timestamp, granularity)
+        return floored if floored == timestamp else floored + _WIDTHS[granularity]
+
+    @staticmethod
+    def record(db: Session, rows: List[Dict]) -> None:
+        if not rows or not RollupService.enabled(db):
+            return
+
+        buckets = {}
+        for row in rows:
+            for granularity in GRANULARITIES:
+                key = (row["device_id"], granularity, RollupService.floor(row["timestamp"], granularity))
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = bucket = {
+                        "device_id": key[0],
+                        "granularity": key[1],
+                        "bucket_start": key[2],
+                        "count": 0,
+                    }
+                    for axis in AXES:
+                        bucket[f"{axis}_sum"] = 0.0
+                        bucket[f"{axis}_min"] = row[axis]
+                        bucket[f"{axis}_max"] = row[axis]
+
+                bucket["count"] += 1
+                for axis in AXES:
+                    value = row[axis]
+                    bucket[f"{axis}_sum"] += value
+                    if value < bucket[f"{axis}_min"]:
+                        bucket[f"{axis}_min"] = value
+                    if value > bucket[f"{axis}_max"]:
+                        bucket[f"{axis}_max"] = value
+
+        # a stable key order keeps concurrent writers from deadlocking on the same buckets
+        values = [buckets[key] for key in sorted(buckets)]
+        for offset in range(0, len(values), UPSERT_CHUNK_SIZE):
+            db.execute(RollupService._upsert_statement(db, values[offset:offset + UPSERT_CHUNK_SIZE]))
+
+    @staticmethod
+    def _upsert_statement(db: Session, values: List[Dict]):
+        if db.get_bind().dialect.name == "postgresql":
+            statement = postgresql_insert(StatsRollup).values(values)
+            least, greatest = func.least, func.greatest
+        else:
+            statement = sqlite_insert(StatsRollup).values(values)
+            least, greatest = func.min, func.max
+
+        excluded = statement.excluded
+        update = {"count": StatsRollup.count + excluded["count"]}
+        for axis in AXES:
+            update[f"{axis}_sum"] = getattr(StatsRollup, f"{axis}_sum") + excluded[f"{axis}_sum"]
+            update[f"{axis}_min"] = least(getattr(StatsRollup, f"{axis}_min"), excluded[f"{axis}_min"])
+            update[f"{axis}_max"] = greatest(getattr(StatsRollup, f"{axis}_max"), excluded[f"{axis}_max"])
+
+        return statement.on_conflict_do_update(
+            index_elements=[StatsRollup.device_id, StatsRollup.granularity, StatsRollup.bucket_start],
+            set_=update
+        )
+
+    @staticmethod
+    def plan(
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            granularities: Tuple[str, ...] = GRANULARITIES
+    ) -> Tuple[List[RollupSegment], List[RawSegment]]:
+        finest = granularities[0]
+        covered_start = RollupService.ceil(start_time, finest) if start_time else None
+        covered_end = RollupService.floor(end_time, finest) if end_time else None
+        if covered_start and covered_end and covered_start >= covered_end:
+            return [], [RawSegment(start=start_time, end=end_time, include_end=True)]
+
+        raw_segments = []
+        if start_time and start_time < covered_start:
+            raw_segments.append(RawSegment(start=start_time, end=covered_start, include_end=False))
+        if end_time:
+            raw_segments.append(RawSegment(start=covered_end, end=end_time, include_end=True))
+
+        return RollupService._cover(covered_start, covered_end, granularities), raw_segments
+
+    @staticmethod
+    def _cover(
+            start: Optional[datetime],
+            end: Optional[datetime],
+            granularities: Tuple[str, ...]
+    ) -> List[RollupSegment]:
+        finest = granularities[0]
+        if len(granularities) == 1:
+            return [RollupSegment(granularity=finest, start=start, end=end)]
+
+        coarse = granularities[1]
+        coarse_start = RollupService.ceil(start, coarse) if start else None
+        coarse_end = RollupService.floor(end, coarse) if end else None
+        if coarse_start and coarse_end and coarse_start >= coarse_end:
+            return [RollupSegment(granularity=finest, start=start, end=end)]
+
+        segments = []
+        if start and start < coarse_start:
+            segments.append(RollupSegment(granularity=finest, start=start, end=coarse_start))
+        if end and coarse_end < end:
+            segments.append(RollupSegment(granularity=finest, start=coarse_end, end=end))
+        return segments + RollupService._cover(coarse_start, coarse_end, granularities[1:])
+
+    @staticmethod
+    def rollup_condition(segments: List[RollupSegment], model=StatsRollup):
+        conditions = []
+        for segment in segments:
+            condition = [model.granularity == segment.granularity]
+            if segment.start:
+                condition.append(model.bucket_start >= segment.start)
+            if segment.end:
+                condition.append(model.bucket_start < segment.end)
+            conditions.append(and_(*condition))
+        return or_(*conditions)
+
+    @staticmethod
+    def raw_condition(segments: List[RawSegment]):
+        conditions = []
+        for segment in segments:
+            condition = []
+            if segment.start:
+                condition.append(Stats.timestamp >= segment.start)
+            if segment.end:
+                condition.append(Stats.timestamp <= segment.end if segment.include_end else Stats.timestamp < segment.end)
+            conditions.append(and_(*condition))
+        return or_(*conditions)
+
+    @staticmethod
+    def summarize(
+            db: Session,
+            device_pks: Optional[Iterable[int]],
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None
+    ) -> Dict[int, RollupSummary]:
+        rollup_segments, raw_segments = RollupService.plan(start_time, end_time)
+        device_pks = list(device_pks) if device_pks is not None else None
+
+        partials = []
+        if rollup_segments:
+            query = db.query(
+                StatsRollup.device_id,
+                func.sum(StatsRollup.count),
+                *[
+                    aggregate
+                    for axis in AXES
+                    for aggregate in (
+                        func.sum(getattr(StatsRollup, f"{axis}_sum")),
+                        func.min(getattr(StatsRollup, f"{axis}_min")),
+                        func.max(getattr(StatsRollup, f"{axis}_max")),
+                    )
+                ]
+            ).filter(RollupService.rollup_condition(rollup_segments))
+            if device_pks is not None:
+                query = query.filter(StatsRollup.device_id.in_(device_pks))
+            partials.extend(query.group_by(StatsRollup.device_id).all())
+
+        if raw_segments:
+            query = db.query(
+                Stats.device_id,
+                func.count(Stats.id),
+                *[
+                    aggregate
+                    for axis in AXES
+                    for aggregate in (
+                        func.sum(getattr(Stats, axis)),
+                        func.min(getattr(Stats, axis)),
+                        func.max(getattr(Stats, axis)),
+                    )
+                ]
+            ).filter(RollupService.raw_condition(raw_segments))
+            if device_pks is not None:
+                query = query.filter(Stats.device_id.in_(device_pks))
+            partials.extend(query.group_by(Stats.device_id).all())
+
+        summaries = {}
+        for row in partials:
+            if not row[1]:
+                continue
+            summary = RollupSummary(
+                count=row[1],
+                x=AxisSummary(*row[2:5]),
+                y=AxisSummary(*row[5:8]),
+                z=AxisSummary(*row[8:11])
+            )
+            previous = summaries.get(row[0])
+            summaries[row[0]] = summary if previous is None else RollupService.merge(previous, summary)
+        return summaries
+
+    @staticmethod
+    def merge(first: RollupSummary, second: RollupSummary) -> RollupSummary:
+        return RollupSummary(
+            count=first.count + second.count,
+            **{
+                axis: AxisSummary(
+                    sum=getattr(first, axis).sum + getattr(second, axis).sum,
+                    min=min(getattr(first, axis).min, getattr(second, axis).min),
+                    max=max(getattr(first, axis).max, getattr(second, axis).max)
+                )
+                for axis in AXES
+            }
+        )
+
+    @staticmethod
+    def bucket_means(
+            db: Session,
+            device_pks: Optional[Iterable[int]],
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None
+    ) -> List[Tuple[int, int, float, float, float]]:
+        rollup_segments, raw_segments = RollupService.plan(start_time, end_time)
+        device_pks = list(device_pks) if device_pks is not None else None
+
+        rows = []
+        if rollup_segments:
+            query = db.query(
+                StatsRollup.device_id,
+                StatsRollup.count,
+                StatsRollup.x_sum / StatsRollup.count,
+                StatsRollup.y_sum / StatsRollup.count,
+                StatsRollup.z_sum / StatsRollup.count
+            ).filter(RollupService.rollup_condition(rollup_segments))
+            if device_pks is not None:
+                query = query.filter(StatsRollup.device_id.in_(device_pks))
+            rows.extend(tuple(row) for row in query.all())
+
+        if raw_segments:
+            query = db.query(Stats.device_id, Stats.x, Stats.y, Stats.z).filter(
+                RollupService.raw_condition(raw_segments)
+            )
+            if device_pks is not None:
+                query = query.filter(Stats.device_id.in_(device_pks))
+            rows.extend((row.device_id, 1, row.x, row.y, row.z) for row in query.all())
+
+        return rows
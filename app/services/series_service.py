@@ -0,0 +1,163 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow.compute as pc
+from sqlalchemy import DateTime, func, type_coerce
+from sqlalchemy.orm import Session
+
+from app.models.database import offload
+from app.models.rollup import StatsRollup
+from app.models.stats import Stats
+from app.services.archive_service import ArchiveService
+from app.services.downsampling import lttb
+from app.services.rollup_service import AXES, RawSegment, RollupService
+
+BUCKETS = {
+    "1m": "minute",
+    "1h": "hour",
+    "1d": "day",
+}
+
+_SQLITE_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+# a bucket is (bucket_start, count, x_min, x_max, x_sum, y_min, y_max, y_sum, z_min, z_max, z_sum)
+Bucket = Tuple
+
+
+class SeriesService:
+    @staticmethod
+    def device_series(
+            db: Session,
+            device_pk: int,
+            granularity: str,
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None
+    ) -> List[Bucket]:
+        # whole buckets come from the rollups, only the partial buckets at the edges of the period scan raw samples
+        if RollupService.enabled(db):
+            rollup_segments, raw_segments = RollupService.plan(start_time, end_time, (granularity,))
+        else:
+            rollup_segments, raw_segments = [], [RawSegment(start=start_time, end=end_time, include_end=True)]
+
+        buckets = []
+        if rollup_segments:
+            query = db.query(
+                StatsRollup.bucket_start,
+                StatsRollup.count,
+                *[
+                    getattr(StatsRollup, f"{axis}_{aggregate}")
+                    for axis in AXES
+                    for aggregate in ("min", "max", "sum")
+                ]
+            ).filter(
+                StatsRollup.device_id == device_pk,
+                RollupService.rollup_condition(rollup_segments)
+            )
+            buckets.extend(tuple(row) for row in query.all())
+
+        for segment in raw_segments:
+            buckets.extend(SeriesService._raw_buckets(db, device_pk, granularity, segment))
+
+        # reading the archive and merging the buckets is local work, it does not need the connection
+        return offload(SeriesService._merge_archived, buckets, device_pk, granularity, raw_segments)
+
+    @staticmethod
+    def _merge_archived(
+            buckets: List[Bucket],
+            device_pk: int,
+            granularity: str,
+            raw_segments: List[RawSegment]
+    ) -> List[Bucket]:
+        for segment in raw_segments:
+            buckets.extend(SeriesService._archived_buckets(device_pk, granularity, segment))
+        return SeriesService._merge(buckets)
+
+    @staticmethod
+    def _bucket_expression(db: Session, granularity: str):
+        if db.get_bind().dialect.name == "postgresql":
+            return func.date_trunc(granularity, Stats.timestamp)
+        return type_coerce(func.strftime(_SQLITE_FORMATS[granularity], Stats.timestamp), DateTime)
+
+    @staticmethod
+    def _raw_buckets(db: Session, device_pk: int, granularity: str, segment: RawSegment) -> List[Bucket]:
+        bucket_start = SeriesService._bucket_expression(db, granularity).label("bucket_start")
+        query = db.query(
+            bucket_start,
+            func.count(Stats.id),
+            *[
+                aggregate(getattr(Stats, axis))
+                for axis in AXES
+                for aggregate in (func.min, func.max, func.sum)
+            ]
+        ).filter(Stats.device_id == device_pk)
+        if segment.start or segment.end:
+            query = query.filter(RollupService.raw_condition([segment]))
+        return [tuple(row) for row in query.group_by(bucket_start).all()]
+
+    @staticmethod
+    def _archived_buckets(device_pk: int, granularity: str, segment: RawSegment) -> List[Bucket]:
+        table = ArchiveService.read(
+            device_pk, segment.start, segment.end, columns=["timestamp", *AXES], include_end=segment.include_end
+        )
+        if table is None or not table.num_rows:
+            return []
+
+        table = table.append_column("bucket_start", pc.floor_temporal(table["timestamp"], unit=granularity))
+        grouped = table.group_by("bucket_start").aggregate(
+            [("x", "count")] + [(axis, aggregate) for axis in AXES for aggregate in ("min", "max", "sum")]
+        )
+        columns = ["bucket_start", "x_count"] + [
+            f"{axis}_{aggregate}" for axis in AXES for aggregate in ("min", "max", "sum")
+        ]
+        return list(zip(*(grouped[column].to_pylist() for column in columns)))
+
+    @staticmethod
+    def _merge(buckets: List[Bucket]) -> List[Bucket]:
+        merged: Dict[datetime, list] = {}
+        for bucket in buckets:
+            if not bucket[1]:
+                continue
+            previous = merged.get(bucket[0])
+            if previous is None:
+                merged[bucket[0]] = list(bucket)
+                continue
+            previous[1] += bucket[1]
+            for offset in range(2, len(bucket), 3):
+                previous[offset] = min(previous[offset], bucket[offset])
+                previous[offset + 1] = max(previous[offset + 1], bucket[offset + 1])
+                previous[offset + 2] += bucket[offset + 2]
+        return [tuple(merged[bucket_start]) for bucket_start in sorted(merged)]
+
+    @staticmethod
+    def downsample(buckets: List[Bucket], points: int) -> List[Bucket]:
+        if len(buckets) <= points:
+            return buckets
+
+        times = np.fromiter((bucket[0].timestamp() for bucket in buckets), dtype=np.float64, count=len(buckets))
+        counts = np.fromiter((bucket[1] for bucket in buckets), dtype=np.float64, count=len(buckets))
+        sums = np.array([bucket[4::3] for bucket in buckets], dtype=np.float64)
+        selected = lttb(times, sums / counts[:, None], points)
+        return [buckets[index] for index in selected.tolist()]
+
+    @staticmethod
+    def to_dicts(buckets: List[Bucket]) -> List[Dict]:
+        return [
+            {
+                "bucket_start": bucket[0],
+                "count": bucket[1],
+                **{
+                    axis: {
+                        "min": bucket[2 + index * 3],
+                        "max": bucket[3 + index * 3],
+                        "avg": bucket[4 + index * 3] / bucket[1],
+                    }
+                    for index, axis in enumerate(AXES)
+                }
+            }
+            for bucket in buckets
+        ]
@@ -0,0 +1,53 @@
+import math
+from typing import Dict, Optional
+
+MIN_INDEXABLE_VALUE = 1e-9
+KEY_OFFSET = 1 << 20
+
+
+class DDSketch:
+    def __init__(self, relative_accuracy: float):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.count = 0
+
+    def key(self, value: float) -> int:
+        # keys are signed so that sorting them orders the bins by value, 0 holds everything close to zero
+        magnitude = abs(value)
+        if magnitude < MIN_INDEXABLE_VALUE:
+            return 0
+
+        index = math.ceil(math.log(magnitude) / self._log_gamma) + KEY_OFFSET
+        return index if value > 0 else -index
+
+    def value(self, key: int) -> float:
+        if key == 0:
+            return 0.0
+
+        magnitude = 2 * self.gamma ** (abs(key) - KEY_OFFSET) / (self.gamma + 1)
+        return magnitude if key > 0 else -magnitude
+
+    def add(self, value: float, count: int = 1) -> None:
+        self.add_bin(self.key(value), count)
+
+    def add_bin(self, key: int, count: int) -> None:
+        self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+
+    def merge(self, other: "DDSketch") -> None:
+        for key, count in other.bins.items():
+            self.add_bin(key, count)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        cumulative = 0
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if cumulative > rank:
+                return self.value(key)
+        return self.value(max(self.bins))
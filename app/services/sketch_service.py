@@ -0,0 +1,125 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.database import offload
+from app.models.sketch import StatsSketchBin
+from app.models.stats import Stats
+from app.services.rollup_service import AXES, RollupService
+from app.services.sketch import DDSketch
+
+SKETCH_GRANULARITIES = ("hour", "day")
+UPSERT_CHUNK_SIZE = 1000
+
+
+class SketchService:
+    @staticmethod
+    def enabled(db: Session) -> bool:
+        return settings.STATS_SKETCHES_ENABLED and db.get_bind().dialect.name in ("postgresql", "sqlite")
+
+    @staticmethod
+    def new_sketch() -> DDSketch:
+        return DDSketch(settings.STATS_SKETCH_RELATIVE_ACCURACY)
+
+    @staticmethod
+    def record(db: Session, rows: List[Dict]) -> None:
+        if not rows or not SketchService.enabled(db):
+            return
+
+        sketch = SketchService.new_sketch()
+        counts = defaultdict(int)
+        for row in rows:
+            for granularity in SKETCH_GRANULARITIES:
+                bucket_start = RollupService.floor(row["timestamp"], granularity)
+                for axis in AXES:
+                    counts[(row["device_id"], granularity, bucket_start, axis, sketch.key(row[axis]))] += 1
+
+        values = [
+            {
+                "device_id": device_id,
+                "granularity": granularity,
+                "bucket_start": bucket_start,
+                "axis": axis,
+                "bin": key,
+                "count": counts[(device_id, granularity, bucket_start, axis, key)],
+            }
+            for device_id, granularity, bucket_start, axis, key in sorted(counts)
+        ]
+        for offset in range(0, len(values), UPSERT_CHUNK_SIZE):
+            db.execute(SketchService._upsert_statement(db, values[offset:offset + UPSERT_CHUNK_SIZE]))
+
+    @staticmethod
+    def _upsert_statement(db: Session, values: List[Dict]):
+        if db.get_bind().dialect.name == "postgresql":
+            statement = postgresql_insert(StatsSketchBin).values(values)
+        else:
+            statement = sqlite_insert(StatsSketchBin).values(values)
+
+        return statement.on_conflict_do_update(
+            index_elements=[
+                StatsSketchBin.device_id,
+                StatsSketchBin.granularity,
+                StatsSketchBin.bucket_start,
+                StatsSketchBin.axis,
+                StatsSketchBin.bin,
+            ],
+            set_={"count": StatsSketchBin.count + statement.excluded["count"]}
+        )
+
+    @staticmethod
+    def load(
+            db: Session,
+            device_pks: Optional[Iterable[int]],
+            start_time: Optional[datetime] = None,
+            end_time: Optional[datetime] = None
+    ) -> Dict[int, Dict[str, DDSketch]]:
+        rollup_segments, raw_segments = RollupService.plan(start_time, end_time, SKETCH_GRANULARITIES)
+        device_pks = list(device_pks) if device_pks is not None else None
+        bins = []
+        samples = []
+
+        if rollup_segments:
+            query = db.query(
+                StatsSketchBin.device_id,
+                StatsSketchBin.axis,
+                StatsSketchBin.bin,
+                func.sum(StatsSketchBin.count)
+            ).filter(RollupService.rollup_condition(rollup_segments, model=StatsSketchBin))
+            if device_pks is not None:
+                query = query.filter(StatsSketchBin.device_id.in_(device_pks))
+            bins = query.group_by(StatsSketchBin.device_id, StatsSketchBin.axis, StatsSketchBin.bin).all()
+
+        if raw_segments:
+            query = db.query(Stats.device_id, Stats.x, Stats.y, Stats.z).filter(
+                RollupService.raw_condition(raw_segments)
+            )
+            if device_pks is not None:
+                query = query.filter(Stats.device_id.in_(device_pks))
+            samples = query.all()
+
+        return offload(SketchService._build, bins, samples)
+
+    @staticmethod
+    def _build(bins: List, samples: List) -> Dict[int, Dict[str, DDSketch]]:
+        sketches = defaultdict(lambda: {axis: SketchService.new_sketch() for axis in AXES})
+        for device_id, axis, key, count in bins:
+            sketches[device_id][axis].add_bin(key, count)
+        for row in samples:
+            device_sketches = sketches[row.device_id]
+            for axis in AXES:
+                device_sketches[axis].add(getattr(row, axis))
+        return sketches
+
+    @staticmethod
+    def merge_all(sketches: Iterable[Dict[str, DDSketch]]) -> Dict[str, DDSketch]:
+        total = {axis: SketchService.new_sketch() for axis in AXES}
+        for device_sketches in sketches:
+            for axis in AXES:
+                total[axis].merge(device_sketches[axis])
+        return total
@@ -1,19 +1,34 @@
+import io
 from datetime import datetime
-from typing import List, Optional, Tuple, Dict
-from sqlalchemy import func
+from typing import Callable, List, Optional, Tuple, Dict
+import numpy as np
+from sqlalchemy import func, insert, select, tuple_
 from sqlalchemy.orm import Session
-import statistics
 
 from app.models.stats import Stats
 from app.models.device import Device
-from app.schemas.stats import StatsCreate, CompleteStatsAnalysis, StatsAnalysis, DeviceStatsAnalysis, UserStatsAnalysis
+from app.schemas.stats import (
+    StatsCreate, StatsIngestRecord, StatsIngestRejection, CompleteStatsAnalysis, StatsAnalysis, DeviceStatsAnalysis,
+    UserStatsAnalysis, percentile_key
+)
+from app.config import settings
+from app.metrics import record_ingested
+from app.models.database import offload
+from app.services.analysis_cache import MISSING, analysis_cache
+from app.services.analysis_engine import AnalysisEngine
+from app.services.analysis_pool import analysis_pool
+from app.services.archive_service import ArchiveService
 from app.services.device_service import DeviceService
+from app.services.rollup_service import AXES, RollupService, RollupSummary
+from app.services.sketch_service import SketchService
 
 
 class StatsService:
+    analysis_cache = analysis_cache
+
     @staticmethod
     def create_device_stats(db: Session, device_id: str, stats_data: StatsCreate) -> Optional[Stats]:
-        device = DeviceService.get_device_by_device_id(db, device_id)
+        device = DeviceService.resolve_device(db, device_id)
         if not device:
             return None
 
@@ -25,10 +40,107 @@ class StatsService:
             timestamp=datetime.utcnow()
         )
         db.add(db_stats)
+        StatsService._record_aggregates(db, [{
+            "device_id": device.id,
+            "timestamp": db_stats.timestamp,
+            "x": db_stats.x,
+            "y": db_stats.y,
+            "z": db_stats.z,
+        }])
         db.commit()
+        StatsService.analysis_cache.bump([device.id])
+        record_ingested(1)
         db.refresh(db_stats)
         return db_stats
 
+    @staticmethod
+    def create_device_stats_batch(db: Session, device_id: str, samples: List[StatsCreate]) -> Optional[int]:
+        device = DeviceService.resolve_device(db, device_id)
+        if not device:
+            return None
+
+        timestamp = datetime.utcnow()
+        rows = [
+            {"device_id": device.id, "timestamp": timestamp, "x": sample.x, "y": sample.y, "z": sample.z}
+            for sample in samples
+        ]
+        StatsService._bulk_insert(db, rows)
+        db.commit()
+        StatsService.analysis_cache.bump([device.id])
+        record_ingested(len(rows))
+        return len(rows)
+
+    @staticmethod
+    def ingest_stats(db: Session, records: List[StatsIngestRecord]) -> Tuple[int, List[StatsIngestRejection]]:
+        device_pks = DeviceService.get_device_pks_by_device_ids(db, (record.device_id for record in records))
+
+        timestamp = datetime.utcnow()
+        rows = []
+        rejected = []
+        for index, record in enumerate(records):
+            pk = device_pks.get(record.device_id)
+            if pk is None:
+                rejected.append(StatsIngestRejection(index=index, device_id=record.device_id, detail="Device not found"))
+                continue
+            rows.append({"device_id": pk, "timestamp": timestamp, "x": record.x, "y": record.y, "z": record.z})
+
+        StatsService._bulk_insert(db, rows)
+        db.commit()
+        StatsService.analysis_cache.bump(row["device_id"] for row in rows)
+        record_ingested(len(rows))
+        return len(rows), rejected
+
+    @staticmethod
+    def write_rows(db: Session, rows: List[Dict]) -> int:
+        try:
+            StatsService._bulk_insert(db, rows)
+            db.commit()
+            StatsService.analysis_cache.bump(row["device_id"] for row in rows)
+            record_ingested(len(rows))
+            return len(rows)
+        except Exception:
+            db.rollback()
+            # buffered rows may belong to a device deleted since they were queued, keep the rest of the batch
+            device_pks = {row["device_id"] for row in rows}
+            existing = {pk for (pk,) in db.query(Device.id).filter(Device.id.in_(device_pks))}
+            kept = [row for row in rows if row["device_id"] in existing]
+            if len(kept) == len(rows):
+                raise
+
+        StatsService._bulk_insert(db, kept)
+        db.commit()
+        StatsService.analysis_cache.bump(row["device_id"] for row in kept)
+        record_ingested(len(kept))
+        return len(kept)
+
+    @staticmethod
+    def _bulk_insert(db: Session, rows: List[Dict]) -> None:
+        if not rows:
+            return
+
+        # psycopg2 can stream the rows through COPY; other drivers get a single executemany INSERT
+        if db.get_bind().dialect.driver == "psycopg2":
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write(
+                    f"{row['device_id']}\t{row['timestamp'].isoformat()}\t{row['x']!r}\t{row['y']!r}\t{row['z']!r}\n"
+                )
+            buffer.seek(0)
+            cursor = db.connection().connection.cursor()
+            try:
+                cursor.copy_expert("COPY stats (device_id, timestamp, x, y, z) FROM STDIN", buffer)
+            finally:
+                cursor.close()
+        else:
+            db.execute(insert(Stats), rows)
+
+        StatsService._record_aggregates(db, rows)
+
+    @staticmethod
+    def _record_aggregates(db: Session, rows: List[Dict]) -> None:
+        RollupService.record(db, rows)
+        SketchService.record(db, rows)
+
     @staticmethod
     def get_device_stats(
             db: Session,
@@ -36,54 +148,88 @@ class StatsService:
             start_time: Optional[datetime] = None,
             end_time: Optional[datetime] = None,
             skip: int = 0,
-            limit: int = 100
-    ) -> List[Stats]:
-        device = DeviceService.get_device_by_device_id(db, device_id)
+            limit: int = 100,
+            after: Optional[Tuple[datetime, int]] = None
+    ) -> List[Tuple[float, float, float, int, int, datetime]]:
+        device = DeviceService.resolve_device(db, device_id)
         if not device:
             return []
 
-        query = db.query(Stats).filter(Stats.device_id == device.id)
-
-        if start_time:
-            query = query.filter(Stats.timestamp >= start_time)
-        if end_time:
-            query = query.filter(Stats.timestamp <= end_time)
+        # plain rows in the order of the Stats schema, the index covers every column
+        query = db.query(Stats.x, Stats.y, Stats.z, Stats.id, Stats.device_id, Stats.timestamp).filter(
+            Stats.device_id == device.id
+        )
+        query = StatsService._filter_time_range(query, start_time, end_time)
+        if after is not None:
+            query = query.filter(tuple_(Stats.timestamp, Stats.id) < tuple_(*after))
 
-        return query.order_by(Stats.timestamp.desc()).offset(skip).limit(limit).all()
+        return query.order_by(Stats.timestamp.desc(), Stats.id.desc()).offset(skip).limit(limit).all()
 
     @staticmethod
     def analyze_device_stats(
             db: Session,
             device_id: str,
             start_time: Optional[datetime] = None,
-            end_time: Optional[datetime] = None
+            end_time: Optional[datetime] = None,
+            approximate: bool = False,
+            percentiles: Optional[List[float]] = None,
+            extended: bool = False,
+            histogram_bins: int = 10
     ) -> Optional[CompleteStatsAnalysis]:
-        device = DeviceService.get_device_by_device_id(db, device_id)
+        device = DeviceService.resolve_device(db, device_id)
         if not device:
             return None
 
-        query = db.query(Stats).filter(Stats.device_id == device.id)
-        if start_time:
-            query = query.filter(Stats.timestamp >= start_time)
-        if end_time:
-            query = query.filter(Stats.timestamp <= end_time)
+        # the tag is taken before reading, so a concurrent ingest leaves the entry stale rather than wrong
+        key = (
+            "device", device.id, start_time, end_time, approximate, tuple(percentiles or ()),
+            extended and histogram_bins
+        )
+        tag = StatsService.analysis_cache.tag([device.id], end_time)
+        analysis = StatsService.analysis_cache.get(key, tag)
+        if analysis is MISSING:
+            analysis = StatsService._analyze_device(
+                db, device.id, start_time, end_time, approximate, percentiles, extended, histogram_bins
+            )
+            StatsService.analysis_cache.set(key, tag, analysis)
+        return analysis
 
-        stats = query.all()
-        if not stats:
-            return None
+    @staticmethod
+    def _analyze_device(
+            db: Session,
+            device_pk: int,
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            approximate: bool,
+            percentiles: Optional[List[float]],
+            extended: bool,
+            histogram_bins: int
+    ) -> Optional[CompleteStatsAnalysis]:
+        if approximate and RollupService.enabled(db):
+            return StatsService._approximate_device_analysis(db, device_pk, start_time, end_time, percentiles)
 
-        x_values = [stat.x for stat in stats]
-        y_values = [stat.y for stat in stats]
-        z_values = [stat.z for stat in stats]
+        archived = bool(ArchiveService.archived_paths(device_pk, start_time, end_time))
+        if extended or archived or not StatsService._supports_ordered_set_aggregates(db):
+            matrix = StatsService._device_matrices(db, [device_pk], start_time, end_time).get(device_pk)
+            if matrix is None:
+                return None
+            return analysis_pool.map(
+                AnalysisEngine.complete_analysis, [(matrix, start_time, end_time, extended, histogram_bins)]
+            )[0]
 
-        x_analysis = StatsService._calculate_stats_analysis(x_values)
-        y_analysis = StatsService._calculate_stats_analysis(y_values)
-        z_analysis = StatsService._calculate_stats_analysis(z_values)
+        query = db.query(
+            *StatsService._aggregate_columns(Stats.x),
+            *StatsService._aggregate_columns(Stats.y),
+            *StatsService._aggregate_columns(Stats.z)
+        ).filter(Stats.device_id == device_pk)
+        row = StatsService._filter_time_range(query, start_time, end_time).one()
+        if not row[2]:
+            return None
 
         return CompleteStatsAnalysis(
-            x=x_analysis,
-            y=y_analysis,
-            z=z_analysis,
+            x=StatsService._analysis_from_aggregates(row[0:5]),
+            y=StatsService._analysis_from_aggregates(row[5:10]),
+            z=StatsService._analysis_from_aggregates(row[10:15]),
             period_start=start_time,
             period_end=end_time
         )
@@ -93,87 +239,316 @@ class StatsService:
             db: Session,
             user_id: int,
             start_time: Optional[datetime] = None,
-            end_time: Optional[datetime] = None
+            end_time: Optional[datetime] = None,
+            approximate: bool = False,
+            percentiles: Optional[List[float]] = None,
+            extended: bool = False,
+            histogram_bins: int = 10
     ) -> Optional[UserStatsAnalysis]:
-        devices = DeviceService.get_devices_by_user_id(db, user_id)
-        if not devices:
-            return None
+        devices = db.query(Device.id, Device.device_id).filter(Device.user_id == user_id).order_by(Device.id).all()
+        key = (
+            "user", user_id, start_time, end_time, approximate, tuple(percentiles or ()),
+            extended and histogram_bins
+        )
+        tag = StatsService.analysis_cache.tag([device.id for device in devices], end_time)
+        analysis = StatsService.analysis_cache.get(key, tag)
+        if analysis is MISSING:
+            analysis = StatsService._analyze_user(
+                db, user_id, devices, start_time, end_time, approximate, percentiles, extended, histogram_bins
+            )
+            StatsService.analysis_cache.set(key, tag, analysis)
+        return analysis
 
-        all_x_values = []
-        all_y_values = []
-        all_z_values = []
+    @staticmethod
+    def _analyze_user(
+            db: Session,
+            user_id: int,
+            devices: List,
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            approximate: bool,
+            percentiles: Optional[List[float]],
+            extended: bool,
+            histogram_bins: int
+    ) -> Optional[UserStatsAnalysis]:
+        if approximate and RollupService.enabled(db):
+            return StatsService._approximate_user_analysis(db, user_id, devices, start_time, end_time, percentiles)
 
-        device_analyses = []
+        archived = any(ArchiveService.archived_paths(device.id, start_time, end_time) for device in devices)
+        if extended or archived or not StatsService._supports_ordered_set_aggregates(db):
+            return StatsService._engine_user_analysis(
+                db, user_id, devices, start_time, end_time, extended, histogram_bins
+            )
 
-        for device in devices:
-            query = db.query(Stats).filter(Stats.device_id == device.id)
-            if start_time:
-                query = query.filter(Stats.timestamp >= start_time)
-            if end_time:
-                query = query.filter(Stats.timestamp <= end_time)
-
-            device_stats = query.all()
-            if not device_stats:
+        query = db.query(
+            func.grouping(Device.id),
+            Device.device_id,
+            *StatsService._aggregate_columns(Stats.x),
+            *StatsService._aggregate_columns(Stats.y),
+            *StatsService._aggregate_columns(Stats.z)
+        ).select_from(Stats).join(Device, Device.id == Stats.device_id).filter(Device.user_id == user_id)
+        query = StatsService._filter_time_range(query, start_time, end_time)
+        rows = query.group_by(
+            func.grouping_sets(tuple_(Device.id, Device.device_id), tuple_())
+        ).order_by(func.grouping(Device.id), Device.id).all()
+
+        device_analyses = []
+        aggregate_stats = None
+        for row in rows:
+            if not row[4]:
                 continue
 
-            device_x_values = [stat.x for stat in device_stats]
-            device_y_values = [stat.y for stat in device_stats]
-            device_z_values = [stat.z for stat in device_stats]
+            stats = CompleteStatsAnalysis(
+                x=StatsService._analysis_from_aggregates(row[2:7]),
+                y=StatsService._analysis_from_aggregates(row[7:12]),
+                z=StatsService._analysis_from_aggregates(row[12:17]),
+                period_start=start_time,
+                period_end=end_time
+            )
+            if row[0]:
+                aggregate_stats = stats
+            else:
+                device_analyses.append(DeviceStatsAnalysis(device_id=row[1], stats=stats))
+
+        if aggregate_stats is None:
+            return None
+
+        return UserStatsAnalysis(
+            user_id=user_id,
+            aggregate_stats=aggregate_stats,
+            device_stats=device_analyses
+        )
+
+    @staticmethod
+    def _engine_user_analysis(
+            db: Session,
+            user_id: int,
+            devices: List,
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            extended: bool,
+            histogram_bins: int
+    ) -> Optional[UserStatsAnalysis]:
+        matrices = StatsService._device_matrices(db, [device.id for device in devices], start_time, end_time)
+        if not matrices:
+            return None
 
-            all_x_values.extend(device_x_values)
-            all_y_values.extend(device_y_values)
-            all_z_values.extend(device_z_values)
+        # the whole user and every device are independent jobs, large ones run on the analysis workers in parallel
+        analyzed = [device for device in devices if device.id in matrices]
+        jobs = [(matrices[device.id], start_time, end_time, extended, histogram_bins) for device in analyzed]
+        combined = offload(AnalysisEngine.concat, matrices.values(), len(AXES))
+        jobs.append((combined, start_time, end_time, extended, histogram_bins))
+        *device_stats, aggregate_stats = analysis_pool.map(AnalysisEngine.complete_analysis, jobs)
 
-            device_x_analysis = StatsService._calculate_stats_analysis(device_x_values)
-            device_y_analysis = StatsService._calculate_stats_analysis(device_y_values)
-            device_z_analysis = StatsService._calculate_stats_analysis(device_z_values)
+        return UserStatsAnalysis(
+            user_id=user_id,
+            aggregate_stats=aggregate_stats,
+            device_stats=[
+                DeviceStatsAnalysis(device_id=device.device_id, stats=stats)
+                for device, stats in zip(analyzed, device_stats)
+            ]
+        )
 
-            device_analysis = DeviceStatsAnalysis(
-                device_id=device.device_id,
-                stats=CompleteStatsAnalysis(
-                    x=device_x_analysis,
-                    y=device_y_analysis,
-                    z=device_z_analysis,
-                    period_start=start_time,
-                    period_end=end_time
-                )
-            )
-            device_analyses.append(device_analysis)
+    @staticmethod
+    def _device_matrices(
+            db: Session,
+            device_pks: List[int],
+            start_time: Optional[datetime],
+            end_time: Optional[datetime]
+    ) -> Dict[int, np.ndarray]:
+        # ids are only needed to match hot rows against archived ones, most periods touch no archive at all
+        with_ids = any(ArchiveService.archived_paths(device_pk, start_time, end_time) for device_pk in device_pks)
+        columns = [Stats.device_id, Stats.id, Stats.x, Stats.y, Stats.z] if with_ids else [
+            Stats.device_id, Stats.x, Stats.y, Stats.z
+        ]
+        statement = select(*columns).filter(Stats.device_id.in_(device_pks))
+        statement = StatsService._filter_time_range(statement, start_time, end_time).order_by(Stats.device_id)
+        fetched = AnalysisEngine.fetch(db, statement, len(columns))
+        if not with_ids:
+            return offload(AnalysisEngine.split, fetched)
+        return offload(StatsService._merge_archived, fetched, device_pks, start_time, end_time)
+
+    @staticmethod
+    def _merge_archived(
+            fetched: np.ndarray,
+            device_pks: List[int],
+            start_time: Optional[datetime],
+            end_time: Optional[datetime]
+    ) -> Dict[int, np.ndarray]:
+        hot = AnalysisEngine.split(fetched)
+        matrices = {}
+
+        # archived months are combined with the hot rows, an exact median over both tiers needs every value
+        for device_pk in device_pks:
+            rows = [hot[device_pk]] if device_pk in hot else []
+            table = ArchiveService.read(device_pk, start_time, end_time, columns=["id", *AXES])
+            if table is not None and table.num_rows:
+                archived = AnalysisEngine.from_columns([table[column].to_numpy() for column in ("id", *AXES)])
+                # an archive run that stopped before deleting its rows leaves them in both tiers, count them once
+                rows = [matrix[~np.isin(matrix[:, 0], archived[:, 0])] for matrix in rows] + [archived]
+            combined = AnalysisEngine.concat(rows, len(AXES) + 1)
+            if len(combined):
+                matrices[device_pk] = combined[:, 1:]
 
-        if not all_x_values:
+        return matrices
+
+    @staticmethod
+    def _approximate_device_analysis(
+            db: Session,
+            device_pk: int,
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            percentiles: Optional[List[float]]
+    ) -> Optional[CompleteStatsAnalysis]:
+        summary = RollupService.summarize(db, [device_pk], start_time, end_time).get(device_pk)
+        if summary is None:
+            return None
+
+        quantiles = StatsService._approximate_quantiles(db, [device_pk], start_time, end_time)
+        return StatsService._rollup_analysis(summary, quantiles[device_pk], percentiles, start_time, end_time)
+
+    @staticmethod
+    def _approximate_user_analysis(
+            db: Session,
+            user_id: int,
+            devices: List,
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            percentiles: Optional[List[float]]
+    ) -> Optional[UserStatsAnalysis]:
+        device_pks = [device.id for device in devices]
+        summaries = RollupService.summarize(db, device_pks, start_time, end_time)
+        if not summaries:
             return None
 
-        aggregate_x_analysis = StatsService._calculate_stats_analysis(all_x_values)
-        aggregate_y_analysis = StatsService._calculate_stats_analysis(all_y_values)
-        aggregate_z_analysis = StatsService._calculate_stats_analysis(all_z_values)
+        quantiles = StatsService._approximate_quantiles(db, device_pks, start_time, end_time, include_total=True)
+        device_analyses = []
+        aggregate = None
+        for device in devices:
+            summary = summaries.get(device.id)
+            if summary is None:
+                continue
+
+            device_analyses.append(DeviceStatsAnalysis(
+                device_id=device.device_id,
+                stats=StatsService._rollup_analysis(
+                    summary, quantiles[device.id], percentiles, start_time, end_time
+                )
+            ))
+            aggregate = summary if aggregate is None else RollupService.merge(aggregate, summary)
 
         return UserStatsAnalysis(
             user_id=user_id,
-            aggregate_stats=CompleteStatsAnalysis(
-                x=aggregate_x_analysis,
-                y=aggregate_y_analysis,
-                z=aggregate_z_analysis,
-                period_start=start_time,
-                period_end=end_time
+            aggregate_stats=StatsService._rollup_analysis(
+                aggregate, quantiles[None], percentiles, start_time, end_time
             ),
             device_stats=device_analyses
         )
 
     @staticmethod
-    def _calculate_stats_analysis(values: List[float]) -> StatsAnalysis:
-        if not values:
-            return StatsAnalysis(
-                min_value=0.0,
-                max_value=0.0,
-                count=0,
-                sum=0.0,
-                median=0.0
+    def _approximate_quantiles(
+            db: Session,
+            device_pks: List[int],
+            start_time: Optional[datetime],
+            end_time: Optional[datetime],
+            include_total: bool = False
+    ) -> Dict[Optional[int], Callable[[str, float], Optional[float]]]:
+        if SketchService.enabled(db):
+            loaded = SketchService.load(db, device_pks, start_time, end_time)
+            sketches = {device_pk: loaded[device_pk] for device_pk in device_pks}
+            if include_total:
+                sketches[None] = offload(SketchService.merge_all, loaded.values())
+            return {
+                key: (lambda axis, q, device_sketches=device_sketches: device_sketches[axis].quantile(q))
+                for key, device_sketches in sketches.items()
+            }
+
+        # without sketches the quantiles fall back to the count-weighted bucket means
+        means = RollupService.bucket_means(db, device_pks, start_time, end_time)
+        groups = {device_pk: [row for row in means if row[0] == device_pk] for device_pk in device_pks}
+        if include_total:
+            groups[None] = means
+        return {
+            key: (lambda axis, q, rows=rows: StatsService._weighted_quantile(
+                [(row[AXES.index(axis) + 2], row[1]) for row in rows], q
+            ))
+            for key, rows in groups.items()
+        }
+
+    @staticmethod
+    def _rollup_analysis(
+            summary: RollupSummary,
+            quantile: Callable[[str, float], Optional[float]],
+            percentiles: Optional[List[float]],
+            start_time: Optional[datetime],
+            end_time: Optional[datetime]
+    ) -> CompleteStatsAnalysis:
+        analyses = {}
+        for axis in AXES:
+            axis_summary = getattr(summary, axis)
+
+            def estimate(q: float) -> float:
+                value = quantile(axis, q)
+                if value is None:
+                    return 0.0
+                return min(max(value, axis_summary.min), axis_summary.max)
+
+            analyses[axis] = StatsAnalysis(
+                min_value=axis_summary.min,
+                max_value=axis_summary.max,
+                count=summary.count,
+                sum=axis_summary.sum,
+                median=estimate(0.5),
+                percentiles={
+                    percentile_key(percentile): estimate(percentile / 100) for percentile in percentiles
+                } if percentiles else None
             )
 
+        return CompleteStatsAnalysis(**analyses, period_start=start_time, period_end=end_time)
+
+    @staticmethod
+    def _weighted_quantile(points: List[Tuple[float, int]], q: float) -> Optional[float]:
+        if not points:
+            return None
+
+        points = sorted(points)
+        rank = q * (sum(weight for _, weight in points) - 1)
+        cumulative = 0
+        for value, weight in points:
+            cumulative += weight
+            if cumulative > rank:
+                return value
+        return points[-1][0]
+
+    @staticmethod
+    def _filter_time_range(query, start_time: Optional[datetime], end_time: Optional[datetime]):
+        if start_time:
+            query = query.filter(Stats.timestamp >= start_time)
+        if end_time:
+            query = query.filter(Stats.timestamp <= end_time)
+        return query
+
+    @staticmethod
+    def _supports_ordered_set_aggregates(db: Session) -> bool:
+        return db.get_bind().dialect.name == "postgresql"
+
+    @staticmethod
+    def _aggregate_columns(column) -> List:
+        return [
+            func.min(column),
+            func.max(column),
+            func.count(column),
+            func.sum(column),
+            func.percentile_cont(0.5).within_group(column),
+        ]
+
+    @staticmethod
+    def _analysis_from_aggregates(aggregates) -> StatsAnalysis:
+        min_value, max_value, count, total, median = aggregates
         return StatsAnalysis(
-            min_value=min(values),
-            max_value=max(values),
-            count=len(values),
-            sum=sum(values),
-            median=statistics.median(values)
-        )
\ No newline at end of file
+            min_value=min_value,
+            max_value=max_value,
+            count=count,
+            sum=total,
+            median=median
+        )
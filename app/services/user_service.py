@@ -1,19 +1,28 @@
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
+from app.services.archive_service import ArchiveService
+from app.services.device_service import DeviceService
 
 
 class UserService:
     @staticmethod
-    def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
-        return db.query(User).offset(skip).limit(limit).all()
+    def get_users(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[User]:
+        query = db.query(User)
+        if after_id is not None:
+            query = query.filter(User.id > after_id)
+        return query.order_by(User.id).offset(skip).limit(limit).all()
 
     @staticmethod
     def get_user(db: Session, user_id: int) -> Optional[User]:
         return db.query(User).filter(User.id == user_id).first()
 
+    @staticmethod
+    def get_user_with_devices(db: Session, user_id: int) -> Optional[User]:
+        return db.query(User).options(selectinload(User.devices)).filter(User.id == user_id).first()
+
     @staticmethod
     def get_user_by_email(db: Session, email: str) -> Optional[User]:
         return db.query(User).filter(User.email == email).first()
@@ -53,6 +62,11 @@ class UserService:
         if not db_user:
             return False
 
+        devices = [(device.id, device.device_id) for device in db_user.devices]
+        DeviceService.delete_stats(db, [device_pk for device_pk, _ in devices])
         db.delete(db_user)
         db.commit()
+        for device_pk, device_id in devices:
+            DeviceService.registry.invalidate(device_id)
+            ArchiveService.remove_device(device_pk)
         return True
\ No newline at end of file
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from typing import List
+
+import httpx
+from fastapi import Depends, FastAPI, Path, Query
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.main import app
+from app.models.database import SessionLocal, get_db, run_db
+from app.models.device import Device
+from app.models.stats import Stats as StatsModel
+from app.models.user import User  # noqa: F401
+from app.schemas.stats import Stats, StatsCreate
+from app.services.device_service import DeviceService
+from app.services.stats_service import StatsService
+
+# the read route as it was before the fast path: ORM objects validated against the response model
+legacy_app = FastAPI()
+
+
+@legacy_app.get(f"{settings.API_V1_STR}/stats/devices/{{device_id}}", response_model=List[Stats])
+async def legacy_read_device_stats(
+        device_id: str = Path(...),
+        limit: int = Query(100, ge=1, le=100),
+        db: Session = Depends(get_db)
+):
+    def query(session: Session):
+        device = DeviceService.resolve_device(session, device_id)
+        return session.query(StatsModel).filter(StatsModel.device_id == device.id).order_by(
+            StatsModel.timestamp.desc(), StatsModel.id.desc()
+        ).limit(limit).all()
+
+    return await run_db(db, query)
+
+
+def prepare_device(samples: int) -> str:
+    db = SessionLocal()
+    try:
+        db_device = Device(device_id=f"bench_{uuid.uuid4().hex[:10]}")
+        db.add(db_device)
+        db.commit()
+        StatsService.create_device_stats_batch(db, db_device.device_id, [StatsCreate(x=1.5, y=-2.25, z=0.125)] * samples)
+        return db_device.device_id
+    finally:
+        db.close()
+
+
+async def measure(target: FastAPI, device_id: str, requests: int, concurrency: int) -> float:
+    url = f"{settings.API_V1_STR}/stats/devices/{device_id}?limit=100"
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=target), base_url="http://bench") as client:
+        for _ in range(10):
+            (await client.get(url)).raise_for_status()
+
+        async def worker(count: int):
+            for _ in range(count):
+                (await client.get(url)).raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+        return (requests // concurrency) * concurrency / (time.perf_counter() - started)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Requests/s of GET /stats/devices/{device_id} before and after the fast path")
+    parser.add_argument("--device-id", help="existing device to read, by default a new one is filled with samples")
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    device_id = args.device_id or prepare_device(args.samples)
+    legacy = asyncio.run(measure(legacy_app, device_id, args.requests, args.concurrency))
+    fast = asyncio.run(measure(app, device_id, args.requests, args.concurrency))
+
+    print(f"legacy ORM + response_model: {legacy:8.1f} req/s")
+    print(f"row tuples + orjson:         {fast:8.1f} req/s  ({fast / legacy:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import httpx
+import numpy as np
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.main import app
+from app.models.database import Base, get_db
+from app.models.device import Device
+from app.models.rollup import StatsRollup  # noqa: F401
+from app.models.sketch import StatsSketchBin  # noqa: F401
+from app.models.stats import Stats
+from app.models.user import User
+from app.schemas.stats import StatsCreate
+from app.services.device_service import DeviceService
+from app.services.partition_service import PartitionService
+from app.services.stats_service import StatsService
+from app.services.user_service import UserService
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+# samples are spaced evenly from a fixed start, so the same arguments always produce the same dataset
+DATASET_START = datetime(2026, 1, 1)
+SAMPLE_INTERVAL = timedelta(seconds=10)
+SEED_CHUNK_SIZE = 50000
+
+
+class Dataset:
+    def __init__(self, seed: int, devices: int, samples: int):
+        self.seed = seed
+        self.devices = devices
+        self.samples = samples
+        self.username = f"bench_{seed}_{devices}x{samples}"
+        self.device_ids = [f"bench_{seed}_{devices}x{samples}_{index:05d}" for index in range(devices)]
+        self.write_device_id = f"bench_{seed}_writes"
+        self.user_id: Optional[int] = None
+
+    @property
+    def end(self) -> datetime:
+        return DATASET_START + SAMPLE_INTERVAL * self.samples
+
+    def describe(self) -> Dict:
+        return {"seed": self.seed, "devices": self.devices, "samples_per_device": self.samples}
+
+
+def seed_dataset(db: Session, dataset: Dataset) -> None:
+    db_user = db.query(User).filter(User.username == dataset.username).first()
+    if db_user is not None:
+        counts = db.query(func.count(Stats.id)).join(Device, Device.id == Stats.device_id).filter(
+            Device.user_id == db_user.id
+        ).scalar()
+        if counts == dataset.devices * dataset.samples:
+            dataset.user_id = db_user.id
+            return
+        UserService.delete_user(db, db_user.id)
+
+    print(f"seeding {dataset.devices} devices x {dataset.samples} samples ...", file=sys.stderr)
+    if PartitionService.is_partitioned(db):
+        PartitionService.ensure_partitions(db, DATASET_START, dataset.end)
+        db.commit()
+
+    db_user = User(username=dataset.username, email=f"{dataset.username}@example.com")
+    db.add(db_user)
+    db.flush()
+    db_devices = [Device(device_id=device_id, user_id=db_user.id) for device_id in dataset.device_ids]
+    db.add_all(db_devices)
+    db.commit()
+
+    rng = np.random.default_rng(dataset.seed)
+    offsets = np.arange(dataset.samples)
+    for db_device in db_devices:
+        values = rng.normal(loc=rng.uniform(-5, 5), scale=rng.uniform(0.5, 3), size=(dataset.samples, 3))
+        rows = [
+            {
+                "device_id": db_device.id,
+                "timestamp": DATASET_START + SAMPLE_INTERVAL * int(offset),
+                "x": float(x),
+                "y": float(y),
+                "z": float(z),
+            }
+            for offset, (x, y, z) in zip(offsets, values)
+        ]
+        for start in range(0, len(rows), SEED_CHUNK_SIZE):
+            StatsService.write_rows(db, rows[start:start + SEED_CHUNK_SIZE])
+    dataset.user_id = db_user.id
+
+
+def prepare_write_device(db: Session, dataset: Dataset) -> None:
+    db_device = DeviceService.get_device_by_device_id(db, dataset.write_device_id)
+    if db_device is None:
+        db.add(Device(device_id=dataset.write_device_id))
+    else:
+        DeviceService.delete_stats(db, [db_device.id])
+    db.commit()
+
+
+def time_calls(fn: Callable[[], object], warmup: int, iterations: int) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def time_requests(client: httpx.AsyncClient, request: Callable, warmup: int, iterations: int) -> List[float]:
+    for _ in range(warmup):
+        (await request(client)).raise_for_status()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        (await request(client)).raise_for_status()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def service_benchmarks(db: Session, dataset: Dataset) -> Dict[str, Callable[[], object]]:
+    device_id = dataset.device_ids[0]
+    sample = StatsCreate(x=1.5, y=-2.25, z=0.125)
+    return {
+        "service.create_device_stats": lambda: StatsService.create_device_stats(db, dataset.write_device_id, sample),
+        "service.get_device_stats": lambda: StatsService.get_device_stats(db, device_id, limit=100),
+        "service.analyze_device_stats": lambda: StatsService.analyze_device_stats(db, device_id),
+        "service.analyze_device_stats.extended": lambda: StatsService.analyze_device_stats(
+            db, device_id, extended=True
+        ),
+        "service.analyze_user_stats": lambda: StatsService.analyze_user_stats(db, dataset.user_id),
+        "service.analyze_user_stats.approximate": lambda: StatsService.analyze_user_stats(
+            db, dataset.user_id, approximate=True
+        ),
+    }
+
+
+def route_benchmarks(dataset: Dataset) -> Dict[str, Callable]:
+    prefix = f"{settings.API_V1_STR}/stats"
+    device_id = dataset.device_ids[0]
+    return {
+        "route.POST /stats/devices/{device_id}": lambda client: client.post(
+            f"{prefix}/devices/{dataset.write_device_id}", json={"x": 1.5, "y": -2.25, "z": 0.125}
+        ),
+        "route.GET /stats/devices/{device_id}": lambda client: client.get(f"{prefix}/devices/{device_id}?limit=100"),
+        "route.GET /stats/devices/{device_id}/series": lambda client: client.get(
+            f"{prefix}/devices/{device_id}/series?bucket=1h"
+        ),
+        "route.POST /stats/devices/{device_id}/analyze": lambda client: client.post(
+            f"{prefix}/devices/{device_id}/analyze", json={}
+        ),
+        "route.POST /stats/users/{user_id}/analyze": lambda client: client.post(
+            f"{prefix}/users/{dataset.user_id}/analyze", json={}
+        ),
+    }
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    ordered = sorted(timings)
+    return {
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "mean": statistics.fmean(ordered),
+        "iterations": len(ordered),
+    }
+
+
+def run(session_factory: sessionmaker, dataset: Dataset, warmup: int, iterations: int, only: Optional[str]):
+    results = {}
+    db = session_factory()
+    try:
+        seed_dataset(db, dataset)
+        prepare_write_device(db, dataset)
+        for name, fn in service_benchmarks(db, dataset).items():
+            if only is None or only in name:
+                results[name] = summarize(time_calls(fn, warmup, iterations))
+                print(f"{name:55s} {results[name]['median'] * 1000:10.3f} ms", file=sys.stderr)
+    finally:
+        db.close()
+
+    def override_get_db() -> Iterator[Session]:
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    async def run_routes():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, request in route_benchmarks(dataset).items():
+                if only is None or only in name:
+                    results[name] = summarize(await time_requests(client, request, warmup, iterations))
+                    print(f"{name:55s} {results[name]['median'] * 1000:10.3f} ms", file=sys.stderr)
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        asyncio.run(run_routes())
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, noise_floor: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        expected = baseline["results"].get(name)
+        if expected is None:
+            continue
+        allowed = baseline.get("thresholds", {}).get(name, threshold)
+        ratio = result["median"] / expected["median"]
+        # sub-millisecond paths jitter by more than any sensible ratio, a slowdown also has to exceed the noise floor
+        slower = ratio > 1 + allowed and result["median"] - expected["median"] > noise_floor
+        status = "REGRESSION" if slower else "ok"
+        print(
+            f"{name:55s} {expected['median'] * 1000:10.3f} -> {result['median'] * 1000:10.3f} ms "
+            f"({ratio:5.2f}x, allowed {1 + allowed:.2f}x) {status}"
+        )
+        if status != "ok":
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time the stats services and routes against a seeded dataset")
+    parser.add_argument("--database-url", default=settings.SQLALCHEMY_DATABASE_URI,
+                        help="PostgreSQL with migrations applied, or sqlite:///path for the portable subset")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=10000, help="samples per device")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--only", help="run only the benchmarks whose name contains this text")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown of the median before a benchmark fails, 0.25 is 25%%")
+    parser.add_argument("--noise-floor", type=float, default=0.5,
+                        help="milliseconds a median may grow regardless of the threshold")
+    parser.add_argument("--allow-missing-baseline", action="store_true",
+                        help="exit with 0 instead of 2 when there is no baseline to compare with")
+    parser.add_argument("--output", type=Path, help="also write the results of this run to a JSON file")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # every iteration has to do the work, not read it back from the caches
+    StatsService.analysis_cache.max_size = 0
+    StatsService.analysis_cache.clear()
+
+    dataset = Dataset(args.seed, args.devices, args.samples)
+    report = {
+        "dialect": engine.dialect.name,
+        "dataset": dataset.describe(),
+        "results": run(session_factory, dataset, args.warmup, args.iterations, args.only),
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.save_baseline:
+        if args.baseline.exists():
+            report["thresholds"] = json.loads(args.baseline.read_text()).get("thresholds", {})
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}, run with --save-baseline first")
+        # a gate without a baseline would pass without checking anything
+        return 0 if args.allow_missing_baseline else 2
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["dialect"] != report["dialect"] or baseline["dataset"] != report["dataset"]:
+        print("the baseline was recorded on another database or dataset, not comparing")
+        return 2
+
+    regressions = compare(report["results"], baseline, args.threshold, args.noise_floor / 1000)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline allows: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
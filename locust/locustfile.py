@@ -1,139 +1,342 @@
+import itertools
 import json
 import random
 import uuid
+from collections import defaultdict
 from datetime import datetime, timedelta
-from locust import HttpUser, task, between
 
+import requests
+from gevent.lock import Semaphore
+from locust import HttpUser, between, constant, events, task
 
-class DeviceStatsUser(HttpUser):
-    wait_time = between(1, 5)
+API_PREFIX = "/api/v1"
+
+# names must be unique per run, everything a user does after creating them comes from its seeded generator
+RUN_ID = uuid.uuid4().hex[:8]
+
+_user_counters = defaultdict(itertools.count)
+
+
+@events.init_command_line_parser.add_listener
+def add_arguments(parser):
+    parser.add_argument("--scenario-seed", type=int, default=1, help="seed of the per-user random generators")
+    parser.add_argument("--ingest-devices", type=int, default=10, help="devices per ingest firehose user")
+    parser.add_argument("--ingest-batch-size", type=int, default=500, help="samples per ingest firehose request")
+    parser.add_argument("--dashboard-devices", type=int, default=5, help="devices per dashboard user")
+    parser.add_argument("--large-user-id", type=int, default=0,
+                        help="analyze an existing user, e.g. one loaded by scripts.seed_stats; 0 creates one")
+    parser.add_argument("--large-user-devices", type=int, default=50, help="devices of the created large user")
+    parser.add_argument("--large-user-samples", type=int, default=2000, help="samples per device of the large user")
+    parser.add_argument("--pagination-samples", type=int, default=20000, help="samples of the paginated device")
+    parser.add_argument("--pagination-pages", type=int, default=50, help="pages walked per pagination task")
+    parser.add_argument("--slo-p95", type=float, default=0, help="p95 latency limit in ms, 0 disables the check")
+    parser.add_argument("--slo-p99", type=float, default=0, help="p99 latency limit in ms, 0 disables the check")
+    parser.add_argument("--slo-error-rate", type=float, default=0,
+                        help="allowed share of failed requests, e.g. 0.01; 0 disables the check")
+    parser.add_argument("--slo-report", default="", help="write the results and the SLO checks to this JSON file")
+
+
+@events.test_start.add_listener
+def seed_wait_times(environment, **kwargs):
+    # wait_time helpers draw from the module-level generator
+    if environment.parsed_options is not None:
+        random.seed(environment.parsed_options.scenario_seed)
+
+
+def random_sample(rng: random.Random) -> dict:
+    return {"x": rng.uniform(-100, 100), "y": rng.uniform(-100, 100), "z": rng.uniform(-100, 100)}
+
+
+def last_day() -> dict:
+    end_time = datetime.utcnow()
+    return {"start_time": (end_time - timedelta(days=1)).isoformat(), "end_time": end_time.isoformat()}
+
+
+class ApiUser(HttpUser):
+    abstract = True
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.api_prefix = "/api/v1"
-        self.device_ids = []
+        self.options = self.environment.parsed_options
+        index = next(_user_counters[type(self).__name__])
+        self.username = f"{type(self).__name__.lower()}_{RUN_ID}_{index}"
+        self.rng = random.Random(f"{getattr(self.options, 'scenario_seed', 1)}:{type(self).__name__}:{index}")
         self.user_id = None
+        self.device_ids = []
+        # fixtures are created outside of self.client, so they count neither in the results nor against the SLOs
+        self.setup_session = requests.Session()
 
-    def on_start(self):
-        # Create a test user
-        username = f"testuser_{uuid.uuid4().hex[:8]}"
-        user_data = {
-            "username": username,
-            "email": f"{username}@example.com"
-        }
+    def setup_request(self, method: str, path: str, payload: dict) -> dict:
+        response = self.setup_session.request(method, f"{self.host}{API_PREFIX}{path}", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def create_owner(self, devices: int, name: str = "") -> None:
+        name = name or self.username
+        self.user_id = self.setup_request("POST", "/users/", {"username": name, "email": f"{name}@example.com"})["id"]
+        for index in range(devices):
+            device_id = f"{name}_dev_{index}"
+            self.setup_request("POST", "/devices/", {"device_id": device_id, "user_id": self.user_id})
+            self.device_ids.append(device_id)
 
-        with self.client.post(f"{self.api_prefix}/users/", json=user_data, catch_response=True) as response:
-            if response.status_code == 201:
-                self.user_id = response.json().get("id")
-                print(f"Created user with ID: {self.user_id}")
+    def post_history(self, device_id: str, samples: int) -> None:
+        for offset in range(0, samples, 1000):
+            self.setup_request("POST", f"/stats/devices/{device_id}/batch", {
+                "samples": [random_sample(self.rng) for _ in range(min(1000, samples - offset))]
+            })
 
-                self.register_devices()
 
-                self.send_initial_stats()
-            else:
-                print(f"Failed to create user: {response.text}")
+class SharedFixture:
+    # users of one scenario share a fixture, the first one to start creates it while the others wait
+    def __init__(self):
+        self.lock = Semaphore()
+        self.user_id = None
+        self.device_ids = []
 
-    def register_devices(self):
-        for i in range(3):
-            device_string_id = f"dev_{uuid.uuid4().hex[:10]}"
+    def ensure(self, user: ApiUser, build) -> None:
+        with self.lock:
+            if self.user_id is None:
+                build(user)
+                self.user_id, self.device_ids = user.user_id, list(user.device_ids)
+        user.user_id, user.device_ids = self.user_id, list(self.device_ids)
 
-            device_data = {
-                "device_id": device_string_id,
-                "name": f"device_{i}_{uuid.uuid4().hex[:6]}",
-                "user_id": self.user_id
-            }
 
-            with self.client.post(f"{self.api_prefix}/devices/", json=device_data, catch_response=True) as response:
-                if response.status_code == 201:
-                    self.device_ids.append(device_string_id)
-                    print(f"Created device with ID: {device_string_id}")
-                else:
-                    print(f"Failed to create device: {response.status_code} - {response.text}")
+class DeviceStatsUser(ApiUser):
+    wait_time = between(1, 5)
 
-    def send_initial_stats(self):
+    def on_start(self):
+        self.create_owner(devices=3)
         for device_id in self.device_ids:
-            for _ in range(5):
-                stats_data = {
-                    "x": random.uniform(-100, 100),
-                    "y": random.uniform(-100, 100),
-                    "z": random.uniform(-100, 100)
-                }
-
-                with self.client.post(
-                        f"{self.api_prefix}/stats/devices/{device_id}",
-                        json=stats_data,
-                        catch_response=True
-                ) as response:
-                    if response.status_code == 201 or response.status_code == 200:
-                        print(f"Initial stats sent for device {device_id}")
-                    else:
-                        print(f"Failed to send initial stats for device {device_id}: {response.text}")
+            self.post_history(device_id, 5)
 
     @task(10)
     def send_device_stats(self):
-        if not self.device_ids:
-            print("No device IDs available")
-            return
+        device_id = self.rng.choice(self.device_ids)
+        self.client.post(
+            f"{API_PREFIX}/stats/devices/{device_id}", json=random_sample(self.rng), name="/stats/devices/[id]"
+        )
 
-        device_id = random.choice(self.device_ids)
-        stats_data = {
-            "x": random.uniform(-100, 100),
-            "y": random.uniform(-100, 100),
-            "z": random.uniform(-100, 100)
-        }
+    @task(3)
+    def get_device_stats(self):
+        device_id = self.rng.choice(self.device_ids)
+        self.client.get(f"{API_PREFIX}/stats/devices/{device_id}", name="/stats/devices/[id]")
+
+    @task(2)
+    def analyze_device_stats(self):
+        device_id = self.rng.choice(self.device_ids)
+        self.client.post(
+            f"{API_PREFIX}/stats/devices/{device_id}/analyze", json=last_day(), name="/stats/devices/[id]/analyze"
+        )
+
+    @task(1)
+    def analyze_user_stats(self):
+        self.client.post(
+            f"{API_PREFIX}/stats/users/{self.user_id}/analyze", json=last_day(), name="/stats/users/[id]/analyze"
+        )
+
+
+class IngestFirehoseUser(ApiUser):
+    wait_time = constant(0)
 
-        with self.client.post(
-                f"{self.api_prefix}/stats/devices/{device_id}",
-                json=stats_data,
-                catch_response=True
-        ) as response:
-            print(f"Send stats response: {response.status_code}, {response.text}")
+    def on_start(self):
+        self.create_owner(devices=self.options.ingest_devices)
 
     @task(3)
-    def get_device_stats(self):
-        if not self.device_ids:
-            return
+    def send_batch(self):
+        device_id = self.rng.choice(self.device_ids)
+        samples = [random_sample(self.rng) for _ in range(self.options.ingest_batch_size)]
+        self.client.post(
+            f"{API_PREFIX}/stats/devices/{device_id}/batch", json={"samples": samples}, name="/stats/devices/[id]/batch"
+        )
+
+    @task(1)
+    def send_mixed_records(self):
+        records = [
+            {"device_id": self.rng.choice(self.device_ids), **random_sample(self.rng)}
+            for _ in range(self.options.ingest_batch_size)
+        ]
+        self.client.post(f"{API_PREFIX}/stats/ingest", json={"records": records}, name="/stats/ingest")
+
+    @task(1)
+    def send_single(self):
+        device_id = self.rng.choice(self.device_ids)
+        self.client.post(
+            f"{API_PREFIX}/stats/devices/{device_id}", json=random_sample(self.rng), name="/stats/devices/[id]"
+        )
+
+
+class DashboardReadUser(ApiUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.create_owner(devices=self.options.dashboard_devices)
+        for device_id in self.device_ids:
+            self.post_history(device_id, 500)
 
-        device_id = random.choice(self.device_ids)
-        self.client.get(f"{self.api_prefix}/stats/devices/{device_id}")
+    @task(5)
+    def latest_stats(self):
+        device_id = self.rng.choice(self.device_ids)
+        self.client.get(f"{API_PREFIX}/stats/devices/{device_id}?limit=100", name="/stats/devices/[id]")
+
+    @task(3)
+    def series(self):
+        device_id = self.rng.choice(self.device_ids)
+        bucket = self.rng.choice(("1m", "1h"))
+        self.client.get(
+            f"{API_PREFIX}/stats/devices/{device_id}/series?bucket={bucket}&points=500",
+            name=f"/stats/devices/[id]/series?bucket={bucket}"
+        )
 
     @task(2)
-    def analyze_device_stats(self):
-        if not self.device_ids:
+    def device_analysis(self):
+        device_id = self.rng.choice(self.device_ids)
+        self.client.post(
+            f"{API_PREFIX}/stats/devices/{device_id}/analyze", json=last_day(), name="/stats/devices/[id]/analyze"
+        )
+
+    @task(1)
+    def user_overview(self):
+        self.client.get(f"{API_PREFIX}/users/{self.user_id}", name="/users/[id]")
+
+    @task(1)
+    def fleet_summary(self):
+        self.client.get(f"{API_PREFIX}/stats/fleet/summary", name="/stats/fleet/summary")
+
+    @task(1)
+    def fleet_ranking(self):
+        metric = self.rng.choice(("max", "min", "mean", "count"))
+        self.client.get(
+            f"{API_PREFIX}/stats/fleet/devices?metric={metric}&axis={self.rng.choice('xyz')}",
+            name="/stats/fleet/devices"
+        )
+
+
+class LargeUserAnalysisUser(ApiUser):
+    wait_time = between(1, 3)
+    fixture = SharedFixture()
+
+    def on_start(self):
+        if self.options.large_user_id:
+            self.user_id = self.options.large_user_id
             return
+        self.fixture.ensure(self, LargeUserAnalysisUser.build_fixture)
 
-        device_id = random.choice(self.device_ids)
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(hours=24)
+    def build_fixture(self):
+        self.create_owner(devices=self.options.large_user_devices, name=f"large_user_{RUN_ID}")
+        for device_id in self.device_ids:
+            self.post_history(device_id, self.options.large_user_samples)
 
-        time_range = {
-            "start_time": start_time.isoformat(),
-            "end_time": end_time.isoformat()
-        }
+    @task(3)
+    def analyze(self):
+        self.client.post(f"{API_PREFIX}/stats/users/{self.user_id}/analyze", json={}, name="/stats/users/[id]/analyze")
 
+    @task(2)
+    def analyze_approximate(self):
         self.client.post(
-            f"{self.api_prefix}/stats/devices/{device_id}/analyze",
-            json=time_range
+            f"{API_PREFIX}/stats/users/{self.user_id}/analyze", json={"approximate": True, "percentiles": [50, 99]},
+            name="/stats/users/[id]/analyze?approximate"
         )
 
     @task(1)
-    def analyze_user_stats(self):
-        if not self.user_id:
-            return
+    def analyze_last_day(self):
+        self.client.post(
+            f"{API_PREFIX}/stats/users/{self.user_id}/analyze", json=last_day(), name="/stats/users/[id]/analyze?day"
+        )
 
-        now = datetime.utcnow()
 
-        start_time = now - timedelta(days=1)
-        end_time = now + timedelta(days=1)
+class DeepPaginationUser(ApiUser):
+    wait_time = between(0, 1)
+    fixture = SharedFixture()
 
-        time_range = {
-            "start_time": start_time.isoformat(),
-            "end_time": end_time.isoformat()
-        }
+    def on_start(self):
+        self.fixture.ensure(self, DeepPaginationUser.build_fixture)
+
+    def build_fixture(self):
+        self.create_owner(devices=1, name=f"pagination_user_{RUN_ID}")
+        self.post_history(self.device_ids[0], self.options.pagination_samples)
+
+    @task(3)
+    def walk_stats_cursor(self):
+        url = f"{API_PREFIX}/stats/devices/{self.device_ids[0]}?limit=100"
+        cursor = None
+        for _ in range(self.options.pagination_pages):
+            response = self.client.get(
+                url + (f"&cursor={cursor}" if cursor else ""), name="/stats/devices/[id]?cursor"
+            )
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
 
-        with self.client.post(
-                f"{self.api_prefix}/stats/users/{self.user_id}/analyze",
-                json=time_range,
-                catch_response=True
-        ) as response:
-            print(f"Analyze user stats response: {response.status_code}, {response.text}")
+    @task(1)
+    def jump_stats_skip(self):
+        # offset paging has to count past every skipped row, the cost cursor paging avoids
+        skip = self.rng.randrange(0, max(1, self.options.pagination_samples - 100))
+        self.client.get(
+            f"{API_PREFIX}/stats/devices/{self.device_ids[0]}?limit=100&skip={skip}", name="/stats/devices/[id]?skip"
+        )
+
+    @task(1)
+    def walk_devices_cursor(self):
+        cursor = None
+        for _ in range(self.options.pagination_pages):
+            response = self.client.get(
+                f"{API_PREFIX}/devices/?limit=100" + (f"&cursor={cursor}" if cursor else ""), name="/devices/?cursor"
+            )
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+
+def check_slos(environment) -> list:
+    options = environment.parsed_options
+    breaches = []
+    for entry in [environment.stats.total, *environment.stats.entries.values()]:
+        if not entry.num_requests:
+            continue
+        label = f"{entry.method} {entry.name}" if entry is not environment.stats.total else "all requests"
+        for percentile, limit in ((0.95, options.slo_p95), (0.99, options.slo_p99)):
+            value = entry.get_response_time_percentile(percentile)
+            if limit and value > limit:
+                breaches.append(f"{label}: p{int(percentile * 100)} {value:.0f} ms > {limit:.0f} ms")
+        if options.slo_error_rate and entry.fail_ratio > options.slo_error_rate:
+            breaches.append(f"{label}: error rate {entry.fail_ratio:.4f} > {options.slo_error_rate}")
+    return breaches
+
+
+def entry_report(entry) -> dict:
+    return {
+        "method": entry.method,
+        "name": entry.name,
+        "requests": entry.num_requests,
+        "failures": entry.num_failures,
+        "error_rate": entry.fail_ratio,
+        "rps": entry.total_rps,
+        "median_ms": entry.median_response_time,
+        "p95_ms": entry.get_response_time_percentile(0.95),
+        "p99_ms": entry.get_response_time_percentile(0.99),
+        "max_ms": entry.max_response_time,
+    }
+
+
+@events.quitting.add_listener
+def enforce_slos(environment, **kwargs):
+    options = environment.parsed_options
+    if options is None:
+        return
+
+    breaches = check_slos(environment)
+    for breach in breaches:
+        print(f"SLO breached: {breach}")
+    if options.slo_report:
+        report = {
+            "seed": options.scenario_seed,
+            "user_classes": sorted({user_class.__name__ for user_class in environment.user_classes}),
+            "slo": {"p95_ms": options.slo_p95, "p99_ms": options.slo_p99, "error_rate": options.slo_error_rate},
+            "breaches": breaches,
+            "total": entry_report(environment.stats.total),
+            "requests": [entry_report(entry) for entry in environment.stats.entries.values()],
+        }
+        with open(options.slo_report, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    if breaches:
+        environment.process_exit_code = 1
@@ -0,0 +1,32 @@
+import argparse
+import sys
+from datetime import datetime
+
+from app.models.database import SessionLocal
+from app.models.device import Device  # noqa: F401
+from app.models.stats import Stats  # noqa: F401
+from app.models.user import User  # noqa: F401
+from app.services.archive_service import ArchiveService
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Move old stats into per-device, per-month Parquet files")
+    parser.add_argument("--now", type=datetime.fromisoformat, help="reference time, defaults to the current UTC time")
+    parser.add_argument("--older-than-days", type=int, help="defaults to STATS_ARCHIVE_AFTER_DAYS")
+    args = parser.parse_args()
+
+    if not ArchiveService.enabled():
+        print("STATS_ARCHIVE_PATH is not set")
+        return 1
+
+    db = SessionLocal()
+    try:
+        result = ArchiveService.archive(db, now=args.now, older_than_days=args.older_than_days)
+        print(f"archived {result['rows']} rows into {result['files']} files")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
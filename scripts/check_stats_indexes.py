@@ -0,0 +1,130 @@
+import argparse
+import sys
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Set, Tuple
+
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+
+from app.models.database import SessionLocal, engine
+from app.models.device import Device
+from app.models.stats import Stats
+from app.models.user import User  # noqa: F401
+from app.services.stats_service import StatsService
+
+DEVICE_INDEX = "ix_stats_device_id_timestamp_id"
+RANGE_INDEX = "ix_stats_timestamp_brin"
+
+
+def capture_statements(db: Session, call: Callable[[Session], object]) -> List[Tuple[str, object]]:
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM stats" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        call(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def plan_index_names(node) -> Set[str]:
+    names = set()
+    if isinstance(node, dict):
+        if "Index Name" in node:
+            names.add(node["Index Name"])
+        for value in node.values():
+            names |= plan_index_names(value)
+    elif isinstance(node, list):
+        for value in node:
+            names |= plan_index_names(value)
+    return names
+
+
+def parent_index_names(db: Session) -> Dict[str, str]:
+    # indexes on partitions are reported under their own names, map them back to the index on stats
+    rows = db.execute(text(
+        "SELECT child.relname, parent.relname FROM pg_inherits i "
+        "JOIN pg_class child ON child.oid = i.inhrelid JOIN pg_class parent ON parent.oid = i.inhparent "
+        "WHERE child.relkind = 'i'"
+    )).all()
+    return dict(rows)
+
+
+def explain(db: Session, statement: str, parameters) -> Set[str]:
+    parents = parent_index_names(db)
+    connection = db.connection()
+    # tables seeded for a check are usually tiny, so force the planner to show whether an index is usable at all
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    return {parents.get(name, name) for name in plan_index_names(plan)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check that the hot stats queries use the stats indexes")
+    parser.add_argument("--device-id", help="string device_id to check, defaults to the device with most stats")
+    parser.add_argument("--user-id", type=int, help="user to check, defaults to the owner of the device")
+    parser.add_argument("--days", type=int, default=1, help="width of the time range used by the queries")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name != "postgresql":
+            print("EXPLAIN checks require PostgreSQL")
+            return 1
+
+        query = db.query(Device.device_id, Device.user_id).join(Stats, Stats.device_id == Device.id)
+        if args.device_id:
+            query = query.filter(Device.device_id == args.device_id)
+        device = query.group_by(Device.id).order_by(func.count(Stats.id).desc()).first()
+        if device is None:
+            print("No device with stats found")
+            return 1
+        user_id = args.user_id if args.user_id is not None else device.user_id
+
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(days=args.days)
+
+        checks = [
+            ("get_device_stats", {DEVICE_INDEX}, lambda session: StatsService.get_device_stats(
+                session, device.device_id, start_time=start_time, end_time=end_time
+            )),
+            ("analyze_device_stats", {DEVICE_INDEX}, lambda session: StatsService.analyze_device_stats(
+                session, device.device_id, start_time=start_time, end_time=end_time
+            )),
+            ("fleet range scan", {RANGE_INDEX}, lambda session: session.query(func.count(Stats.id)).filter(
+                Stats.timestamp >= start_time, Stats.timestamp <= end_time
+            ).scalar()),
+        ]
+        if user_id is not None:
+            # a user owning most of the fleet is legitimately served by the range index
+            checks.append((
+                "analyze_user_stats",
+                {DEVICE_INDEX, RANGE_INDEX},
+                lambda session: StatsService.analyze_user_stats(
+                    session, user_id, start_time=start_time, end_time=end_time
+                ),
+            ))
+
+        failed = False
+        for name, expected_indexes, call in checks:
+            statements = capture_statements(db, call)
+            db.rollback()
+            for statement, parameters in statements:
+                used = explain(db, statement, parameters)
+                db.rollback()
+                status = "OK" if expected_indexes & used else "MISSING"
+                failed = failed or status != "OK"
+                print(f"{status:8} {name}: expected {' or '.join(sorted(expected_indexes))}, "
+                      f"plan uses {sorted(used) or 'no index'}")
+
+        return 1 if failed else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
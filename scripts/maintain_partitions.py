@@ -0,0 +1,29 @@
+import argparse
+import sys
+from datetime import datetime
+
+from app.models.database import SessionLocal
+from app.services.partition_service import PartitionService
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pre-create future stats partitions and expire old ones")
+    parser.add_argument("--now", type=datetime.fromisoformat, help="reference time, defaults to the current UTC time")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if not PartitionService.is_partitioned(db):
+            print("The stats table is not partitioned")
+            return 1
+
+        result = PartitionService.run_maintenance(db, now=args.now)
+        print(f"created: {', '.join(result['created']) or '-'}")
+        print(f"expired: {', '.join(result['expired']) or '-'}")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+import argparse
+import io
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import create_engine, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.device import Device
+from app.models.stats import Stats
+from app.models.user import User
+from app.services.partition_service import PartitionService
+from app.services.sketch import KEY_OFFSET, MIN_INDEXABLE_VALUE
+
+POSTGRES_EPOCH = datetime(2000, 1, 1)
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")
+COPY_TRAILER = (-1).to_bytes(2, "big", signed=True)
+
+# one binary COPY tuple: the field count, then a length and a big-endian value per column
+COPY_ROW = np.dtype([
+    ("fields", ">i2"),
+    ("device_id_length", ">i4"), ("device_id", ">i4"),
+    ("timestamp_length", ">i4"), ("timestamp", ">i8"),
+    ("x_length", ">i4"), ("x", ">f8"),
+    ("y_length", ">i4"), ("y", ">f8"),
+    ("z_length", ">i4"), ("z", ">f8"),
+])
+
+SECONDS_PER_DAY = 86400
+SPIKE_PROBABILITY = 0.0005
+
+AGGREGATE_COLUMNS = "count, x_sum, x_min, x_max, y_sum, y_min, y_max, z_sum, z_min, z_max"
+
+_engine: Optional[Engine] = None
+
+
+class Plan:
+    def __init__(self, seed: int, users: int, devices: int, start: datetime, days: float, interval: float,
+                 rate_skew: float, device_skew: float):
+        self.seed = seed
+        self.users = users
+        self.devices = devices
+        self.start = start
+        self.end = start + timedelta(days=days)
+        self.usernames = [f"seed{seed}_user_{index:06d}" for index in range(users)]
+        self.device_ids = [f"seed{seed}_device_{index:06d}" for index in range(devices)]
+
+        rng = np.random.default_rng([seed, 0])
+        # a zipf-like weight per rank, shuffled so the busy devices and the large users are spread over the indexes
+        owner_weights = 1.0 / np.arange(1, users + 1) ** device_skew
+        self.owners = rng.choice(users, size=devices, p=owner_weights / owner_weights.sum())
+        rate_weights = 1.0 / np.arange(1, devices + 1) ** rate_skew
+        rate_weights = rng.permutation(rate_weights / rate_weights.mean())
+        self.intervals = np.maximum(interval / rate_weights, 1.0)
+
+    def samples(self, index: int) -> int:
+        return int((self.end - self.start).total_seconds() // self.intervals[index])
+
+
+def device_samples(plan: Plan, index: int, device_pk: int, chunk_rows: int):
+    # independent streams per device and per purpose, the same arguments always produce the same samples
+    streams = [np.random.default_rng(sequence) for sequence in np.random.SeedSequence([plan.seed, 1, index]).spawn(5)]
+    shape, jitter, noise, drift, spikes = streams
+    baseline = shape.uniform(-5, 5, 3)
+    amplitude = shape.uniform(0.5, 3, 3)
+    phase = shape.uniform(0, 2 * math.pi, 3)
+    spread = shape.uniform(0.2, 1.5, 3)
+
+    interval = plan.intervals[index]
+    start = (plan.start - POSTGRES_EPOCH).total_seconds()
+    total = plan.samples(index)
+    level = np.zeros(3)
+    for offset in range(0, total, chunk_rows):
+        count = min(chunk_rows, total - offset)
+        # samples arrive once per interval with up to half an interval of jitter, so they stay ordered
+        seconds = (np.arange(offset, offset + count) + jitter.uniform(0, 0.5, count)) * interval
+        daily = np.sin(2 * math.pi * seconds[:, None] / SECONDS_PER_DAY + phase)
+        walk = level + np.cumsum(drift.normal(0, 0.01, (count, 3)), axis=0)
+        level = walk[-1]
+        values = baseline + amplitude * daily + walk + noise.normal(0, spread, (count, 3))
+        # rare spikes of 5 to 10 times the noise, the outliers the analyses have to cope with
+        hit_rows, hit_axes = np.nonzero(spikes.random((count, 3)) < SPIKE_PROBABILITY)
+        magnitudes = spikes.choice((-1, 1), len(hit_rows)) * spikes.uniform(5, 10, len(hit_rows))
+        values[hit_rows, hit_axes] += magnitudes * spread[hit_axes]
+
+        rows = np.empty(count, dtype=COPY_ROW)
+        rows["fields"] = 5
+        rows["device_id_length"] = 4
+        rows["device_id"] = device_pk
+        rows["timestamp_length"] = 8
+        rows["timestamp"] = ((start + seconds) * 1_000_000).astype(np.int64)
+        for position, axis in enumerate(("x", "y", "z")):
+            rows[f"{axis}_length"] = 8
+            rows[axis] = values[:, position]
+        yield rows
+
+
+def _bin_expression() -> str:
+    # same key function as DDSketch.key, evaluated in SQL like the sketch bins migration does
+    accuracy = settings.STATS_SKETCH_RELATIVE_ACCURACY
+    log_gamma = math.log((1 + accuracy) / (1 - accuracy))
+    return (
+        f"CASE WHEN abs(value) < {MIN_INDEXABLE_VALUE!r} THEN 0 "
+        f"ELSE sign(value)::integer * (ceil(ln(abs(value)) / {log_gamma!r})::integer + {KEY_OFFSET}) END"
+    )
+
+
+def aggregate_statements() -> List[str]:
+    statements = []
+    if settings.STATS_ROLLUPS_ENABLED:
+        statements.append(
+            f"INSERT INTO stats_rollups (device_id, granularity, bucket_start, {AGGREGATE_COLUMNS}) "
+            "SELECT device_id, 'minute', date_trunc('minute', timestamp), count(*), "
+            "sum(x), min(x), max(x), sum(y), min(y), max(y), sum(z), min(z), max(z) "
+            "FROM stats WHERE device_id = %(device_id)s GROUP BY device_id, date_trunc('minute', timestamp)"
+        )
+        for granularity, source in (("hour", "minute"), ("day", "hour")):
+            statements.append(
+                f"INSERT INTO stats_rollups (device_id, granularity, bucket_start, {AGGREGATE_COLUMNS}) "
+                f"SELECT device_id, '{granularity}', date_trunc('{granularity}', bucket_start), sum(count), "
+                "sum(x_sum), min(x_min), max(x_max), sum(y_sum), min(y_min), max(y_max), "
+                "sum(z_sum), min(z_min), max(z_max) "
+                f"FROM stats_rollups WHERE device_id = %(device_id)s AND granularity = '{source}' "
+                f"GROUP BY device_id, date_trunc('{granularity}', bucket_start)"
+            )
+    if settings.STATS_SKETCHES_ENABLED:
+        bin_expression = _bin_expression()
+        statements.append(
+            "INSERT INTO stats_sketch_bins (device_id, granularity, bucket_start, axis, bin, count) "
+            f"SELECT device_id, 'hour', date_trunc('hour', timestamp), axis, {bin_expression}, count(*) "
+            "FROM stats CROSS JOIN LATERAL (VALUES ('x', x), ('y', y), ('z', z)) AS axes (axis, value) "
+            "WHERE device_id = %(device_id)s "
+            f"GROUP BY device_id, date_trunc('hour', timestamp), axis, {bin_expression}"
+        )
+        statements.append(
+            "INSERT INTO stats_sketch_bins (device_id, granularity, bucket_start, axis, bin, count) "
+            "SELECT device_id, 'day', date_trunc('day', bucket_start), axis, bin, sum(count) "
+            "FROM stats_sketch_bins WHERE device_id = %(device_id)s AND granularity = 'hour' "
+            "GROUP BY device_id, date_trunc('day', bucket_start), axis, bin"
+        )
+    return statements
+
+
+def _init_worker(database_url: str) -> None:
+    global _engine
+    # ctrl-c is handled by the parent, which terminates the workers and with them their open transactions
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _engine = create_engine(database_url, pool_size=1, max_overflow=0)
+
+
+def load_device(job: Tuple[Plan, int, int, int, bool]) -> int:
+    plan, index, device_pk, chunk_rows, aggregates = job
+    rows = 0
+    connection = _engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # the samples and the aggregates of a device commit together, an interrupted device leaves nothing behind
+        for chunk in device_samples(plan, index, device_pk, chunk_rows):
+            buffer = io.BytesIO()
+            buffer.write(COPY_HEADER)
+            buffer.write(chunk.tobytes())
+            buffer.write(COPY_TRAILER)
+            buffer.seek(0)
+            cursor.copy_expert("COPY stats (device_id, timestamp, x, y, z) FROM STDIN WITH (FORMAT binary)", buffer)
+            rows += len(chunk)
+        if aggregates and rows:
+            for statement in aggregate_statements():
+                cursor.execute(statement, {"device_id": device_pk})
+        connection.commit()
+        cursor.close()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return rows
+
+
+def ensure_owners(db: Session, plan: Plan) -> Dict[str, int]:
+    db.execute(postgresql_insert(User).values([
+        {"username": username, "email": f"{username}@example.com"} for username in plan.usernames
+    ]).on_conflict_do_nothing())
+    user_pks = dict(db.execute(select(User.username, User.id).where(User.username.in_(plan.usernames))).all())
+
+    db.execute(postgresql_insert(Device).values([
+        {"device_id": device_id, "user_id": user_pks[plan.usernames[owner]]}
+        for device_id, owner in zip(plan.device_ids, plan.owners)
+    ]).on_conflict_do_nothing())
+    device_pks = dict(db.execute(select(Device.device_id, Device.id).where(Device.device_id.in_(plan.device_ids))).all())
+    db.commit()
+    return device_pks
+
+
+def loaded_devices(db: Session, device_pks: List[int]) -> set:
+    # a device's samples commit in one transaction, any sample at all means an earlier run finished it
+    loaded = set()
+    for device_pk in device_pks:
+        if db.execute(select(1).where(Stats.device_id == device_pk).limit(1)).first() is not None:
+            loaded.add(device_pk)
+    return loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Generate users, devices and time-distributed stats and COPY them into PostgreSQL in parallel"
+    )
+    parser.add_argument("--database-url", default=settings.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--start", type=datetime.fromisoformat,
+                        help="first sample time, defaults to --days before today's midnight (UTC); "
+                             "pass it explicitly when a resumed run may start on another day")
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=60, help="mean seconds between the samples of a device")
+    parser.add_argument("--rate-skew", type=float, default=1.0,
+                        help="zipf exponent of the per-device sample rates, 0 gives every device the same rate")
+    parser.add_argument("--device-skew", type=float, default=1.0,
+                        help="zipf exponent of the devices per user, 0 spreads the devices evenly")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-rows", type=int, default=200000, help="rows per COPY statement")
+    parser.add_argument("--skip-aggregates", action="store_true",
+                        help="do not build the rollups and sketch bins of the seeded devices")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if engine.dialect.driver != "psycopg2":
+        print("seeding streams the rows through COPY and needs a postgresql+psycopg2 database URL")
+        return 1
+
+    start = args.start or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(
+        days=args.days
+    )
+    plan = Plan(args.seed, args.users, args.devices, start, args.days, args.interval, args.rate_skew, args.device_skew)
+
+    with Session(engine) as db:
+        if PartitionService.is_partitioned(db):
+            PartitionService.ensure_partitions(db, plan.start, plan.end)
+            db.commit()
+        device_pks = ensure_owners(db, plan)
+        loaded = loaded_devices(db, list(device_pks.values()))
+
+    jobs = [
+        (plan, index, device_pks[device_id], args.chunk_rows, not args.skip_aggregates)
+        for index, device_id in enumerate(plan.device_ids) if device_pks[device_id] not in loaded
+    ]
+    # the busiest devices first, so no single large device is left running alone at the end
+    jobs.sort(key=lambda job: -plan.samples(job[1]))
+    total = sum(plan.samples(job[1]) for job in jobs)
+    print(
+        f"{len(plan.device_ids)} devices of {len(plan.usernames)} users from {plan.start:%Y-%m-%d %H:%M} to "
+        f"{plan.end:%Y-%m-%d %H:%M}: {len(loaded)} already loaded, {len(jobs)} to load ({total} rows) "
+        f"with {args.workers} workers"
+    )
+    if not jobs:
+        return 0
+
+    started = time.perf_counter()
+    rows = 0
+    # spawned workers open their own connections instead of inheriting this process's
+    context = multiprocessing.get_context("spawn")
+    try:
+        with context.Pool(args.workers, initializer=_init_worker, initargs=(args.database_url,)) as pool:
+            for done, device_rows in enumerate(pool.imap_unordered(load_device, jobs), 1):
+                rows += device_rows
+                elapsed = time.perf_counter() - started
+                print(
+                    f"\r{done}/{len(jobs)} devices, {rows}/{total} rows, {rows / elapsed:,.0f} rows/s",
+                    end="", flush=True
+                )
+    except KeyboardInterrupt:
+        print("\ninterrupted, run again with the same arguments to load the remaining devices")
+        return 130
+    elapsed = time.perf_counter() - started
+    print(f"\nloaded {rows} rows in {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s)")
+
+    with engine.connect() as connection:
+        connection.exec_driver_sql("ANALYZE stats")
+        connection.commit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services.archive_service import ArchiveService, MonthFile
+
+DEVICE_PK = 1
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STATS_ARCHIVE_PATH", str(tmp_path))
+    for month_start in (datetime(2024, 1, 1), datetime(2024, 2, 1)):
+        month_file = MonthFile(DEVICE_PK, month_start)
+        month_file.write([
+            SimpleNamespace(
+                id=month_start.month * 100 + day, timestamp=month_start + timedelta(days=day), x=day, y=0.0, z=0.0
+            )
+            for day in range(10)
+        ])
+        month_file.close()
+    return tmp_path
+
+
+def test_read_with_naive_bounds(archive):
+    table = ArchiveService.read(DEVICE_PK, datetime(2024, 1, 5), datetime(2024, 2, 3))
+
+    assert table["id"].to_pylist() == [104, 105, 106, 107, 108, 109, 200, 201, 202]
+
+
+def test_read_with_aware_bounds(archive):
+    # 06:00+06:00 is midnight UTC, the bounds select the same rows as their naive UTC equivalents
+    offset = timezone(timedelta(hours=6))
+    start_time = datetime(2024, 1, 5, 6, tzinfo=offset)
+    end_time = datetime(2024, 2, 3, 6, tzinfo=offset)
+
+    paths = ArchiveService.archived_paths(DEVICE_PK, start_time, end_time)
+    table = ArchiveService.read(DEVICE_PK, start_time, end_time)
+
+    assert [path.stem for path in paths] == ["2024_01", "2024_02"]
+    assert table["id"].to_pylist() == [104, 105, 106, 107, 108, 109, 200, 201, 202]
+
+
+def test_aware_bounds_skip_months_outside_the_period(archive):
+    # 01:00+02:00 on February 1st is still January in UTC
+    offset = timezone(timedelta(hours=2))
+    january = ArchiveService.archived_paths(DEVICE_PK, datetime(2024, 2, 1, 1, tzinfo=offset), None)
+    february = ArchiveService.archived_paths(DEVICE_PK, datetime(2024, 2, 1, 2, tzinfo=offset), None)
+
+    assert [path.stem for path in january] == ["2024_01", "2024_02"]
+    assert [path.stem for path in february] == ["2024_02"]
+
+
+def test_read_excluding_end(archive):
+    table = ArchiveService.read(DEVICE_PK, datetime(2024, 2, 1), datetime(2024, 2, 3), include_end=False)
+
+    assert table["id"].to_pylist() == [200, 201]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.services.downsampling import lttb
+
+
+def _series(count, columns=1, seed=0):
+    generator = np.random.default_rng(seed)
+    times = np.cumsum(generator.uniform(0.5, 1.5, count))
+    return times, generator.normal(size=(count, columns))
+
+
+@pytest.mark.parametrize("count, threshold", [(10, 3), (100, 10), (1000, 37), (1001, 1000), (5000, 250)])
+@pytest.mark.parametrize("columns", [1, 3])
+def test_keeps_endpoints_and_one_point_per_bucket(count, threshold, columns):
+    times, values = _series(count, columns)
+
+    selected = lttb(times, values, threshold)
+
+    assert len(selected) == threshold
+    assert selected[0] == 0
+    assert selected[-1] == count - 1
+    assert np.all(np.diff(selected) > 0)
+
+    # interior points come one from each of the threshold - 2 buckets between the endpoints
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    for bucket, index in enumerate(selected[1:-1]):
+        assert edges[bucket] <= index < edges[bucket + 1]
+
+
+@pytest.mark.parametrize("threshold", [2, 1, 0, 50, 51])
+def test_returns_every_point_when_there_is_nothing_to_drop(threshold):
+    times, values = _series(50)
+
+    assert np.array_equal(lttb(times, values, threshold), np.arange(50))
+
+
+def test_keeps_a_spike():
+    times = np.arange(1000, dtype=np.float64)
+    values = np.zeros(1000)
+    values[613] = 100.0
+
+    assert 613 in lttb(times, values, 20)
+
+
+def test_spike_in_any_series_is_kept():
+    times = np.arange(1000, dtype=np.float64)
+    values = np.zeros((1000, 3))
+    values[:, 0] = np.sin(times / 50)
+    values[401, 2] = -1e6
+
+    assert 401 in lttb(times, values, 30)
+
+
+def test_constant_series_does_not_divide_by_zero():
+    times = np.arange(100, dtype=np.float64)
+
+    with np.errstate(all="raise"):
+        selected = lttb(times, np.full((100, 2), 7.0), 10)
+
+    assert len(selected) == 10
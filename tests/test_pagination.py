@@ -0,0 +1,74 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.pagination import InvalidCursor, decode_id_cursor, decode_timestamp_cursor, encode_cursor
+
+
+def _raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("value", [0, 1, 41, 2 ** 40])
+def test_id_cursor_round_trip(value):
+    assert decode_id_cursor(encode_cursor(value)) == value
+
+
+@pytest.mark.parametrize("timestamp", [
+    datetime(2024, 1, 1),
+    datetime(2024, 2, 29, 23, 59, 59, 999999),
+    datetime(2024, 6, 1, 12, 30, tzinfo=timezone(timedelta(hours=-5))),
+])
+def test_timestamp_cursor_round_trip(timestamp):
+    assert decode_timestamp_cursor(encode_cursor(timestamp, 17)) == (timestamp, 17)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(datetime(2024, 1, 1), 2 ** 60 - 1)
+
+    assert "=" not in cursor
+    assert "+" not in cursor
+    assert "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "%%%%",
+    encode_cursor(5)[:-2],
+    _raw_cursor({"id": 5}),
+    _raw_cursor([]),
+    _raw_cursor([5, 6]),
+    _raw_cursor(["5"]),
+    _raw_cursor([5.0]),
+    _raw_cursor([True]),
+    _raw_cursor([None]),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_tampered_id_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_id_cursor(cursor)
+
+
+@pytest.mark.parametrize("cursor", [
+    encode_cursor(5),
+    encode_cursor(datetime(2024, 1, 1)),
+    encode_cursor(datetime(2024, 1, 1), 5, 6),
+    encode_cursor(datetime(2024, 1, 1), "5"),
+    encode_cursor(datetime(2024, 1, 1), 5.5),
+    encode_cursor(datetime(2024, 1, 1), False),
+    encode_cursor("2024-13-01T00:00:00", 5),
+    encode_cursor("yesterday", 5),
+    encode_cursor(1704067200, 5),
+    encode_cursor(datetime(2024, 1, 1), 5)[:-3],
+])
+def test_tampered_timestamp_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_timestamp_cursor(cursor)
+
+
+def test_invalid_cursor_is_a_value_error():
+    with pytest.raises(ValueError):
+        decode_id_cursor("not a cursor")
@@ -0,0 +1,129 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.rollup_service import GRANULARITIES, RawSegment, RollupSegment, RollupService
+
+WIDTHS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+
+def _periods():
+    generator = random.Random(12)
+    base = datetime(2024, 2, 27, 21, 58, 31, 250000)
+    periods = [
+        (datetime(2024, 1, 1), datetime(2024, 1, 8)),
+        (datetime(2024, 1, 1, 0, 0, 30), datetime(2024, 1, 1, 0, 0, 40)),
+        (datetime(2024, 1, 1, 0, 0, 30), datetime(2024, 1, 1, 0, 1, 40)),
+        (datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 10)),
+        (datetime(2024, 1, 1, 10, 0, 5), datetime(2024, 1, 3, 7, 0, 5)),
+    ]
+    for _ in range(40):
+        start = base + timedelta(seconds=generator.uniform(0, 10 * 86400))
+        periods.append((start, start + timedelta(seconds=generator.expovariate(1 / 86400))))
+    return periods
+
+
+def _probes(start, end, rollups, raws):
+    probes = {start, end}
+    for segment in [*rollups, *raws]:
+        for boundary in (segment.start, segment.end):
+            if boundary is not None:
+                probes.update((boundary - timedelta(microseconds=1), boundary, boundary + timedelta(microseconds=1)))
+    span = end - start
+    probes.update(start + span * (index / 200) for index in range(201))
+    return sorted(probe for probe in probes if start <= probe <= end)
+
+
+def _covering(timestamp, rollups, raws):
+    count = 0
+    for segment in rollups:
+        bucket_start = RollupService.floor(timestamp, segment.granularity)
+        after_start = segment.start is None or bucket_start >= segment.start
+        before_end = segment.end is None or bucket_start < segment.end
+        count += after_start and before_end
+    for segment in raws:
+        after_start = segment.start is None or timestamp >= segment.start
+        if segment.end is None:
+            before_end = True
+        else:
+            before_end = timestamp <= segment.end if segment.include_end else timestamp < segment.end
+        count += after_start and before_end
+    return count
+
+
+@pytest.mark.parametrize("granularities", [GRANULARITIES, ("minute",), ("hour", "day"), ("minute", "hour")])
+@pytest.mark.parametrize("start, end", _periods())
+def test_plan_covers_every_timestamp_once(start, end, granularities):
+    rollups, raws = RollupService.plan(start, end, granularities)
+
+    for timestamp in _probes(start, end, rollups, raws):
+        assert _covering(timestamp, rollups, raws) == 1, timestamp
+
+
+@pytest.mark.parametrize("start, end", _periods())
+def test_rollup_segments_hold_whole_buckets_inside_the_period(start, end):
+    rollups, _ = RollupService.plan(start, end)
+
+    for segment in rollups:
+        assert segment.granularity in GRANULARITIES
+        assert segment.start < segment.end
+        assert start <= segment.start and segment.end <= end
+        assert RollupService.floor(segment.start, segment.granularity) == segment.start
+        assert RollupService.floor(segment.end, segment.granularity) == segment.end
+
+
+@pytest.mark.parametrize("start, end", _periods())
+def test_rollup_segments_do_not_overlap(start, end):
+    rollups, _ = RollupService.plan(start, end)
+
+    spans = sorted((segment.start, segment.end) for segment in rollups)
+    for (_, previous_end), (next_start, _) in zip(spans, spans[1:]):
+        assert previous_end <= next_start
+
+
+def test_unbounded_period_uses_the_coarsest_rollup():
+    assert RollupService.plan(None, None) == ([RollupSegment(granularity="day", start=None, end=None)], [])
+
+
+def test_open_start_covers_the_partial_minute_at_the_end():
+    end = datetime(2024, 1, 2, 3, 4, 5)
+
+    rollups, raws = RollupService.plan(None, end)
+
+    assert raws == [RawSegment(start=datetime(2024, 1, 2, 3, 4), end=end, include_end=True)]
+    assert rollups == [
+        RollupSegment(granularity="minute", start=datetime(2024, 1, 2, 3), end=datetime(2024, 1, 2, 3, 4)),
+        RollupSegment(granularity="hour", start=datetime(2024, 1, 2), end=datetime(2024, 1, 2, 3)),
+        RollupSegment(granularity="day", start=None, end=datetime(2024, 1, 2)),
+    ]
+
+
+def test_open_end_is_covered_by_rollups():
+    start = datetime(2024, 1, 2, 3, 4, 5)
+
+    rollups, raws = RollupService.plan(start, None)
+
+    assert raws == [RawSegment(start=start, end=datetime(2024, 1, 2, 3, 5), include_end=False)]
+    assert rollups[-1] == RollupSegment(granularity="day", start=datetime(2024, 1, 3), end=None)
+
+
+def test_period_inside_one_minute_scans_raw_samples_only():
+    start = datetime(2024, 1, 1, 0, 0, 10)
+    end = datetime(2024, 1, 1, 0, 0, 50)
+
+    assert RollupService.plan(start, end) == ([], [RawSegment(start=start, end=end, include_end=True)])
+
+
+@pytest.mark.parametrize("timestamp", [datetime(2024, 1, 1), datetime(2024, 12, 31, 23, 59, 59, 999999)])
+@pytest.mark.parametrize("granularity", GRANULARITIES)
+def test_floor_and_ceil_bracket_the_timestamp(timestamp, granularity):
+    floored = RollupService.floor(timestamp, granularity)
+    ceiled = RollupService.ceil(timestamp, granularity)
+
+    assert floored <= timestamp <= ceiled
+    assert ceiled - floored in (timedelta(0), WIDTHS[granularity])
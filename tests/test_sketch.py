@@ -0,0 +1,81 @@
+import math
+import random
+
+import pytest
+
+from app.services.sketch import DDSketch
+
+QUANTILES = (0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0)
+
+
+def _exact(values, q):
+    # the rank the sketch uses: the first value whose cumulative count passes q * (n - 1)
+    return sorted(values)[math.floor(q * (len(values) - 1))]
+
+
+def _assert_within(sketch, values, q):
+    exact = _exact(values, q)
+    assert abs(sketch.quantile(q) - exact) <= sketch.relative_accuracy * abs(exact) + 1e-12
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.02, 0.05])
+@pytest.mark.parametrize("distribution", ["uniform", "lognormal", "signed", "tiny"])
+def test_quantiles_within_relative_accuracy(relative_accuracy, distribution):
+    generator = random.Random(relative_accuracy * 1000 + len(distribution))
+    values = {
+        "uniform": lambda: generator.uniform(0, 1000),
+        "lognormal": lambda: generator.lognormvariate(0, 4),
+        "signed": lambda: generator.gauss(0, 50),
+        "tiny": lambda: generator.uniform(1e-6, 1e-3),
+    }[distribution]
+    values = [values() for _ in range(5000)]
+    sketch = DDSketch(relative_accuracy)
+    for value in values:
+        sketch.add(value)
+
+    assert sketch.count == len(values)
+    for q in QUANTILES:
+        _assert_within(sketch, values, q)
+
+
+def test_values_close_to_zero_share_the_zero_bin():
+    sketch = DDSketch(0.01)
+    for value in (0.0, 1e-12, -1e-12):
+        sketch.add(value)
+
+    assert sketch.bins == {0: 3}
+    assert sketch.quantile(0.5) == 0.0
+
+
+def test_merge_matches_a_single_sketch():
+    generator = random.Random(7)
+    values = [generator.lognormvariate(1, 2) for _ in range(3000)]
+    merged = DDSketch(0.01)
+    whole = DDSketch(0.01)
+    for part in (values[:1000], values[1000:]):
+        sketch = DDSketch(0.01)
+        for value in part:
+            sketch.add(value)
+            whole.add(value)
+        merged.merge(sketch)
+
+    assert merged.bins == whole.bins
+    assert merged.count == whole.count
+    for q in QUANTILES:
+        _assert_within(merged, values, q)
+
+
+def test_add_bin_with_counts_matches_repeated_adds():
+    repeated = DDSketch(0.02)
+    counted = DDSketch(0.02)
+    for value, count in ((3.5, 4), (-2.0, 2), (100.0, 1)):
+        for _ in range(count):
+            repeated.add(value)
+        counted.add_bin(counted.key(value), count)
+
+    assert repeated.bins == counted.bins
+    assert [repeated.quantile(q) for q in QUANTILES] == [counted.quantile(q) for q in QUANTILES]
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert DDSketch(0.01).quantile(0.5) is None